@@ -0,0 +1,240 @@
+import argparse
+import copy
+import csv
+import itertools
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data import data
+import sim  # World + simulation rules
+import regions  # Polygons and stamps
+
+# Runs a scenario many times (different seeds / parameters) in parallel and collects stats
+#
+# Scenario file (JSON):
+# {
+#   "width": 160, "height": 88,          world size in cells
+#   "steps": 2000,                      ticks per run
+#   "seeds": [1, 2, 3]  or  "runs": 8   (runs = seeds 0..runs-1)
+#   "place": [                          initial placements, in order
+#     {"element": "wood", "rect": [x, y, w, h]},
+#     {"element": "fire", "at": [x, y], "brush": 2},
+#     {"element": "sand", "line": [x1, y1, x2, y2], "brush": 1},
+#     {"element": "wall", "polygon": [[x, y], [x, y], [x, y]]},
+#     {"stamp": "reactor", "at": [x, y]},  a prefab from regions.STAMP_FOLDER
+#     {"element": null, "rect": [...]}      null erases
+#   ],
+#   "overrides": {"fire": {"burn": 0.05}},        element changes for every run
+#   "sweep": {"fire.burn": [0.02, 0.04, 0.08]},   every combination gets run with every seed
+#   "metrics": ["populations", "exploded", "achievements", "speed"],
+#   "sample_every": 100,                ticks between population samples
+#   "order": "shuffle"                  particle update order (see ORDERS in sim.py)
+# }
+
+METRICS = ["populations", "exploded", "achievements", "speed"]
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    for key, value in scenario.get("overrides", {}).items():
+        if key not in data:
+            raise ValueError(f"Unknown element in overrides: {key}")
+    for param in scenario.get("sweep", {}):
+        if param.split(".")[0] not in data:
+            raise ValueError(f"Unknown element in sweep: {param}")
+    if scenario.get("order", "shuffle") not in sim.ORDERS:
+        raise ValueError(f"Unknown update order: {scenario['order']} (pick from {', '.join(sim.ORDERS)})")
+    for metric in scenario.get("metrics", METRICS):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric} (pick from {', '.join(METRICS)})")
+    return scenario
+
+def place(placements):
+    # Put the scenario's initial particles on the board
+    for item in placements:
+        element = item.get("element")
+        if element is not None and element not in data:
+            raise ValueError(f"Unknown element: {element}")
+        brush = item.get("brush", 1)
+        if "rect" in item:
+            x0, y0, w, h = item["rect"]
+            for x in range(x0, x0 + w):
+                for y in range(y0, y0 + h):
+                    sim.draw_with_brush(x, y, element, 1)
+        elif "polygon" in item:
+            regions.fill(regions.polygon([tuple(p) for p in item["polygon"]]), element)
+        elif "stamp" in item:
+            regions.stamp(item["stamp"], *item["at"])
+        elif "line" in item:
+            for x, y in sim.bresenham(*item["line"]):
+                sim.draw_with_brush(x, y, element, brush)
+        else:
+            x, y = item["at"]
+            sim.draw_with_brush(x, y, element, brush)
+
+def from_json(key, value):
+    # JSON has no tuples, but life ranges have to be one (data.py writes them as (low, high))
+    if key == "slife" and isinstance(value, list):
+        return tuple(value)
+    return value
+
+def set_param(path, value):
+    # "fire.burn" -> data["fire"]["burn"]
+    element, key = path.split(".", 1)
+    data[element][key] = from_json(key, value)
+
+def setup(scenario, seed=None, params=None):
+    # Get the world ready for a run (also used by server.py --scenario)
+    for element, changes in scenario.get("overrides", {}).items():
+        data[element].update({key: from_json(key, value) for key, value in changes.items()})
+    for path, value in (params or {}).items():
+        set_param(path, value)
+    if seed is not None:
+        random.seed(seed)
+    sim.reset_counters()
+    sim.update_order = scenario.get("order", "shuffle")
+    sim.reset(scenario.get("width", 160), scenario.get("height", 88))
+    place(scenario.get("place", []))
+
+def make_jobs(scenario):
+    if "seeds" in scenario:
+        seeds = scenario["seeds"]
+    else:
+        seeds = list(range(scenario.get("runs", 1)))
+    sweep = scenario.get("sweep", {})
+    paths = list(sweep)
+    jobs = []
+    for values in itertools.product(*(sweep[p] for p in paths)):
+        params = dict(zip(paths, values))
+        for seed in seeds:
+            jobs.append((len(jobs), seed, params))
+    return jobs
+
+# Untouched element data, so runs in the same worker process don't leak overrides into each other
+original_data = copy.deepcopy(data)
+
+def restore_data():
+    for element in data:
+        data[element].clear()
+        data[element].update(copy.deepcopy(original_data[element]))
+
+def run_one(scenario, job):
+    run, seed, params = job
+    restore_data()
+    setup(scenario, seed, params)
+
+    metrics = scenario.get("metrics", METRICS)
+    steps = scenario.get("steps", 1000)
+    sample_every = scenario.get("sample_every", 100)
+    unlocked = {}  # achievement id -> tick it got unlocked
+    series = []  # (tick, populations)
+    track_achievements = "achievements" in metrics
+    track_populations = "populations" in metrics
+
+    def on_unlock(achievement_id):
+        unlocked[achievement_id] = sim.tick
+
+    if track_achievements:
+        sim.check_achievements(on_unlock)  # Placement achievements
+    if track_populations:
+        series.append((sim.tick, sim.populations()))
+    start = time.perf_counter()
+    for _ in range(steps):
+        sim.step()
+        if track_achievements:
+            sim.check_achievements(on_unlock)
+        if track_populations and sim.tick % sample_every == 0:
+            series.append((sim.tick, sim.populations()))
+    seconds = time.perf_counter() - start
+
+    result = {"run": run, "seed": seed, "params": params, "steps": steps}
+    if "speed" in metrics:
+        result["seconds"] = seconds
+        result["steps_per_sec"] = steps / seconds if seconds else float("inf")
+    if "exploded" in metrics:
+        result["exploded"] = {k: v for k, v in sim.exploded.items() if v}
+        result["exploded_total"] = sum(sim.exploded.values())
+    if track_achievements:
+        result["achievement_counts"] = dict(sim.achievement_counts)
+        result["achievement_counts_total"] = sum(sim.achievement_counts.values())
+        result["unlocked"] = unlocked
+    if track_populations:
+        result["populations"] = series[-1][1]
+        result["series"] = series
+    return result
+
+def run_batch(scenario, workers=None):
+    jobs = make_jobs(scenario)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_one, itertools.repeat(scenario), jobs))
+    return results
+
+def table(results):
+    # One row per run, flat columns
+    param_names = sorted({p for r in results for p in r["params"]})
+    elements = list(data)
+    header = ["run", "seed"] + param_names + ["steps"]
+    if "steps_per_sec" in results[0]:
+        header += ["seconds", "steps_per_sec"]
+    if "exploded_total" in results[0]:
+        header += ["exploded_total"] + [f"exploded_{e}" for e in elements]
+    if "unlocked" in results[0]:
+        header += ["achievement_counts_total", "unlocked"]
+    if "populations" in results[0]:
+        header += [f"pop_{e}" for e in elements]
+    rows = []
+    for r in results:
+        row = [r["run"], r["seed"]] + [r["params"].get(p, "") for p in param_names] + [r["steps"]]
+        if "steps_per_sec" in r:
+            row += [round(r["seconds"], 3), round(r["steps_per_sec"], 1)]
+        if "exploded_total" in r:
+            row += [r["exploded_total"]] + [r["exploded"].get(e, 0) for e in elements]
+        if "unlocked" in r:
+            row += [r["achievement_counts_total"], " ".join(f"{a}@{t}" for a, t in r["unlocked"].items())]
+        if "populations" in r:
+            row += [r["populations"][e] for e in elements]
+        rows.append(row)
+    return header, rows
+
+def write_series(results, path):
+    # Long format: run, tick, element, count
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["run", "tick", "element", "count"])
+        for r in results:
+            for tick, counts in r.get("series", []):
+                for element, count in counts.items():
+                    writer.writerow([r["run"], tick, element, count])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a scenario many times in parallel and collect stats.")
+    parser.add_argument("scenario", help="Scenario JSON file")
+    parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: all cores)")
+    parser.add_argument("--out", help="Write the result table here (CSV) instead of stdout")
+    parser.add_argument("--series", help="Write population samples over time here (CSV)")
+    parser.add_argument("--multi", action="store_true", help="Step all the runs together with multiworld.py (sweeps of burn/density/etc only, no achievements)")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    start = time.perf_counter()
+    if args.multi:
+        import multiworld  # Not at the top, it imports this
+        results = multiworld.run_batch(scenario)
+    else:
+        results = run_batch(scenario, args.workers)
+    header, rows = table(results)
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(header)
+        writer.writerows(rows)
+    if args.series:
+        write_series(results, args.series)
+    print(f"{len(results)} runs in {time.perf_counter() - start:.1f}s", file=sys.stderr)
@@ -0,0 +1,46 @@
+import argparse
+import gc
+import time
+
+import batch  # Scenario files
+import sim  # World + simulation rules
+
+# Compares sim's update orders (see ORDERS in sim.py) on the same scenario and seed:
+# time spent just ordering the particles, time per whole step, and garbage collections done.
+
+def gc_collections():
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+def bench(scenario, order, steps, seed):
+    batch.setup(scenario, seed)
+    sim.update_order = order
+    order_seconds = 0.0
+    start_collections = gc_collections()
+    start = time.perf_counter()
+    for _ in range(steps):
+        t = time.perf_counter()
+        sim.particle_order()
+        order_seconds += time.perf_counter() - t
+        sim.step()
+    seconds = time.perf_counter() - start - order_seconds
+    return {
+        "order": order,
+        "order_ms": order_seconds / steps * 1000,
+        "step_ms": seconds / steps * 1000,
+        "collections": gc_collections() - start_collections,
+        "particles": len(sim.cells) - sim.counts[0],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the particle update orders.")
+    parser.add_argument("scenario", nargs="?", default="scenarios/forest_fire.json", help="Scenario JSON file")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--orders", default=",".join(sim.ORDERS), help="Comma separated, default all")
+    args = parser.parse_args()
+
+    scenario = batch.load_scenario(args.scenario)
+    print(f"{'order':10} {'order ms/tick':>14} {'step ms/tick':>13} {'gc runs':>8} {'particles':>10}")
+    for order in args.orders.split(","):
+        r = bench(scenario, order, args.steps, args.seed)
+        print(f"{r['order']:10} {r['order_ms']:14.2f} {r['step_ms']:13.2f} {r['collections']:8} {r['particles']:10}")
@@ -0,0 +1,256 @@
+import argparse
+import json
+import mmap
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import sim  # World + simulation rules
+import heat  # Temperature field
+import history  # Undo/redo
+
+# Worlds bigger than memory: the world lives on disk in chunks, only a window of it is in sim
+#
+# A store is a folder with world.json (size, chunk size, element names, tick, electricity ctypes
+# outside the window) and cells.bin: every CHUNK x CHUNK chunk one after another (x-major, cells
+# packed like sim.cells), memory-mapped and sparse, so a never touched chunk costs no disk.
+# sim.cells is the window: a rectangle of chunks around the camera that gets simulated, drawn and
+# drawn on as usual. Everything outside it is dormant (frozen, not simulated).
+# When the camera gets close to the edge of the window, follow() moves the window. Chunks that leave
+# go to an in-memory LRU cache (saved to disk when they fall out of it). Chunks that come in are
+# taken from the cache, or read from disk. prefetch() reads the chunks ahead of the camera into
+# the cache a few at a time, so moving the window doesn't wait for the disk.
+
+CHUNK = 64  # Cells per side, must be a multiple of lod.CHUNK_COLUMNS so its chunks line up
+CACHE_BYTES = 256 * 1024 * 1024
+MARGIN = CHUNK  # Move the window when the view gets this close to its edge (cells)
+PREFETCH_PER_CALL = 4  # Chunks read from disk per prefetch() at most
+LOOKAHEAD = 30  # Calls of camera movement to prefetch ahead for
+
+path = None
+width, height = 0, 0  # Whole world, in cells
+chunks_x, chunks_y = 0, 0
+origin = (0, 0)  # Window's top left chunk
+disk = None  # numpy view of cells.bin: disk[k] is chunk k (CHUNK x CHUNK)
+mapped = None
+cells_file = None
+cache = OrderedDict()  # (cx, cy) -> CHUNK x CHUNK array, least recently used first
+dirty = set()  # Cached chunks that differ from disk
+stored_ctype = {}  # (x, y) world cell -> ctype, for electricity outside the window
+last_camera = None  # World cell the camera was at last prefetch()
+
+def chunk_bytes():
+    return CHUNK * CHUNK * 2
+
+def cache_capacity():
+    return max(1, CACHE_BYTES // chunk_bytes())
+
+def create(store_path, world_width, world_height):
+    # A new empty world (rounded up to whole chunks)
+    os.makedirs(store_path, exist_ok=True)
+    cx, cy = -(-world_width // CHUNK), -(-world_height // CHUNK)
+    with open(os.path.join(store_path, "cells.bin"), "wb") as f:
+        f.truncate(cx * cy * chunk_bytes())
+    info = {"width": cx * CHUNK, "height": cy * CHUNK, "chunk": CHUNK, "elements": sim.element_names, "tick": 0, "ctype": []}
+    with open(os.path.join(store_path, "world.json"), "w") as f:
+        json.dump(info, f)
+
+def open_store(store_path, window_width, window_height):
+    # Load a store and put the window at its top left. Window size is rounded up to whole chunks.
+    global path, width, height, chunks_x, chunks_y, disk, mapped, cells_file, stored_ctype, origin, last_camera
+    with open(os.path.join(store_path, "world.json")) as f:
+        info = json.load(f)
+    if info["chunk"] != CHUNK:
+        raise ValueError(f"{store_path} uses {info['chunk']} cell chunks, not {CHUNK}")
+    if info["elements"] != sim.element_names:
+        raise ValueError(f"{store_path} was saved with different elements")
+    path = store_path
+    width, height = info["width"], info["height"]
+    chunks_x, chunks_y = width // CHUNK, height // CHUNK
+    cells_file = open(os.path.join(store_path, "cells.bin"), "r+b")
+    mapped = mmap.mmap(cells_file.fileno(), 0)
+    disk = np.frombuffer(mapped, dtype=np.uint16).reshape(chunks_x * chunks_y, CHUNK, CHUNK)
+    stored_ctype = {(x, y): element for x, y, element in info["ctype"]}
+    cache.clear()
+    dirty.clear()
+    last_camera = None
+
+    w = min(chunks_x, -(-window_width // CHUNK)) * CHUNK
+    h = min(chunks_y, -(-window_height // CHUNK)) * CHUNK
+    sim.reset(w, h)
+    sim.tick = info["tick"]
+    origin = (0, 0)
+    grid = window_grid()
+    for cx, cy in window_chunks(origin):
+        grid[(cx - origin[0]) * CHUNK:(cx - origin[0] + 1) * CHUNK, (cy - origin[1]) * CHUNK:(cy - origin[1] + 1) * CHUNK] = fetch(cx, cy)
+    take_ctype(origin)
+    sim.recount()
+    history.clear()
+    history.window_at = lambda: origin
+    history.move_window = move_window
+
+def window_grid():
+    return np.frombuffer(sim.cells, dtype=np.uint16).reshape(sim.W, sim.H)
+
+def window_chunks(at):
+    return [(at[0] + x, at[1] + y) for x in range(sim.W // CHUNK) for y in range(sim.H // CHUNK)]
+
+def fetch(cx, cy):
+    # A chunk that is about to go in the window: from the cache if there, else from disk
+    key = (cx, cy)
+    if key in cache:
+        dirty.discard(key)  # The window has it now, it gets saved from there
+        return cache.pop(key)
+    return disk[cx * chunks_y + cy].copy()
+
+def keep(cx, cy, chunk):
+    # A chunk that left the window goes in the cache
+    key = (cx, cy)
+    cache[key] = chunk
+    cache.move_to_end(key)
+    if not np.array_equal(chunk, disk[cx * chunks_y + cy]):
+        dirty.add(key)
+    evict()
+
+def evict():
+    while len(cache) > cache_capacity():
+        key, chunk = cache.popitem(last=False)
+        if key in dirty:
+            dirty.discard(key)
+            disk[key[0] * chunks_y + key[1]] = chunk
+
+def take_ctype(at):
+    # stored_ctype entries inside the window at `at` move into sim.ctype
+    x0, y0 = at[0] * CHUNK, at[1] * CHUNK
+    for (x, y) in [k for k in stored_ctype if x0 <= k[0] < x0 + sim.W and y0 <= k[1] < y0 + sim.H]:
+        sim.ctype[(x - x0) * sim.H + (y - y0)] = stored_ctype.pop((x, y))
+
+def move_window(cx, cy):
+    # Put the window's top left at chunk cx, cy. Returns how far the window moved, in cells.
+    global origin
+    cx = max(0, min(cx, chunks_x - sim.W // CHUNK))
+    cy = max(0, min(cy, chunks_y - sim.H // CHUNK))
+    if (cx, cy) == origin:
+        return 0, 0
+    old = origin
+    grid = window_grid()
+    old_cells = grid.copy()
+    old_keys = set(window_chunks(old))
+    new_keys = set(window_chunks((cx, cy)))
+
+    # Leaving chunks to the cache, and the electricity ctypes in them to stored_ctype
+    for key in old_keys - new_keys:
+        x, y = (key[0] - old[0]) * CHUNK, (key[1] - old[1]) * CHUNK
+        keep(key[0], key[1], old_cells[x:x + CHUNK, y:y + CHUNK].copy())
+    old_ctype = sim.ctype
+    sim.ctype = {}
+    for i, element in old_ctype.items():
+        x, y = divmod(i, sim.H)
+        wx, wy = old[0] * CHUNK + x, old[1] * CHUNK + y
+        if (wx // CHUNK, wy // CHUNK) in new_keys:
+            sim.ctype[(wx - cx * CHUNK) * sim.H + (wy - cy * CHUNK)] = element
+        else:
+            stored_ctype[(wx, wy)] = element
+
+    # Shift what stays, fetch what comes in. Heat stays with the cells, new ones start at ambient.
+    temperature = np.full_like(heat.temperature, heat.AMBIENT)
+    for key in new_keys:
+        x, y = (key[0] - cx) * CHUNK, (key[1] - cy) * CHUNK
+        if key in old_keys:
+            ox, oy = (key[0] - old[0]) * CHUNK, (key[1] - old[1]) * CHUNK
+            grid[x:x + CHUNK, y:y + CHUNK] = old_cells[ox:ox + CHUNK, oy:oy + CHUNK]
+            temperature[x:x + CHUNK, y:y + CHUNK] = heat.temperature[ox:ox + CHUNK, oy:oy + CHUNK]
+        else:
+            grid[x:x + CHUNK, y:y + CHUNK] = fetch(*key)
+    heat.temperature[:] = temperature
+    sim.mark_columns(0, sim.W)
+    origin = (cx, cy)
+    take_ctype(origin)
+    sim.recount()
+    return (cx - old[0]) * CHUNK, (cy - old[1]) * CHUNK
+
+def fits(view_width, view_height):
+    # Whether a view this big (cells) fits in the window, so follow() can keep it inside
+    return path is None or (view_width <= sim.W and view_height <= sim.H)
+
+def follow(view_x, view_y, view_width, view_height):
+    # Call with the visible rectangle (window cells) every frame. Moves the window when the view gets
+    # near its edge, and returns how far it moved in cells (subtract that from the camera).
+    if path is None or not fits(view_width, view_height):
+        return 0, 0  # A view wider than the window can't be centred in it, it would chase the far corner
+    near_edge = ((view_x < MARGIN and origin[0] > 0) or
+                 (view_y < MARGIN and origin[1] > 0) or
+                 (view_x + view_width > sim.W - MARGIN and origin[0] + sim.W // CHUNK < chunks_x) or
+                 (view_y + view_height > sim.H - MARGIN and origin[1] + sim.H // CHUNK < chunks_y))
+    if not near_edge:
+        return 0, 0
+    # Center the view in the window
+    center_x = origin[0] * CHUNK + view_x + view_width / 2
+    center_y = origin[1] * CHUNK + view_y + view_height / 2
+    return move_window(round((center_x - sim.W / 2) / CHUNK), round((center_y - sim.H / 2) / CHUNK))
+
+def prefetch(view_x, view_y):
+    # Read into the cache the chunks the window will want if the camera keeps going the way it is going
+    global last_camera
+    if path is None:
+        return 0
+    camera = (origin[0] * CHUNK + view_x, origin[1] * CHUNK + view_y)
+    moving = (camera[0] - last_camera[0], camera[1] - last_camera[1]) if last_camera else (0, 0)
+    last_camera = camera
+    if moving == (0, 0):
+        return 0
+    ahead_x = origin[0] + round(moving[0] * LOOKAHEAD / CHUNK)
+    ahead_y = origin[1] + round(moving[1] * LOOKAHEAD / CHUNK)
+    resident = set(window_chunks(origin))
+    read = 0
+    for key in window_chunks((ahead_x, ahead_y)):
+        if read >= PREFETCH_PER_CALL:
+            break
+        if key in resident or key in cache or not (0 <= key[0] < chunks_x and 0 <= key[1] < chunks_y):
+            continue
+        cache[key] = disk[key[0] * chunks_y + key[1]].copy()
+        read += 1
+    evict()
+    return read
+
+def save():
+    # Everything to disk: the window, the cache, the ctypes and tick
+    if path is None:
+        return
+    grid = window_grid()
+    for cx, cy in window_chunks(origin):
+        x, y = (cx - origin[0]) * CHUNK, (cy - origin[1]) * CHUNK
+        disk[cx * chunks_y + cy] = grid[x:x + CHUNK, y:y + CHUNK]
+    for key in list(dirty):
+        disk[key[0] * chunks_y + key[1]] = cache[key]
+    dirty.clear()
+    mapped.flush()
+    ctype = [[x, y, element] for (x, y), element in stored_ctype.items()]
+    for i, element in sim.ctype.items():
+        x, y = divmod(i, sim.H)
+        ctype.append([origin[0] * CHUNK + x, origin[1] * CHUNK + y, element])
+    info = {"width": width, "height": height, "chunk": CHUNK, "elements": sim.element_names, "tick": sim.tick, "ctype": ctype}
+    with open(os.path.join(path, "world.json"), "w") as f:
+        json.dump(info, f)
+
+def close():
+    global path, disk, mapped, cells_file
+    save()
+    disk = None
+    if mapped is not None:
+        mapped.close()
+        cells_file.close()
+    mapped = cells_file = None
+    path = None
+    cache.clear()
+    history.window_at = history.move_window = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make a new on-disk world for powdergame.py --store.")
+    parser.add_argument("path", help="Folder to make")
+    parser.add_argument("--size", default="8192x4096", help="World size in cells")
+    args = parser.parse_args()
+    w, h = (int(n) for n in args.size.lower().split("x"))
+    create(args.path, w, h)
+    print(f"Made {args.path}: {-(-w // CHUNK) * CHUNK}x{-(-h // CHUNK) * CHUNK} cells")
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import zlib
+
+import numpy as np
+
+from data import achievements
+import batch  # Placements (same format as scenario files)
+import sim  # World + simulation rules
+import regions  # Area edits, clipboard, stamps
+
+# Scripting endpoint: send a batch of commands, get all the answers back in one round trip
+#
+# Over localhost TCP (or a Unix socket with --unix). Every request and every reply is:
+#   <I length of the rest> <I length of the JSON part> JSON + binary part
+# A request's JSON is a list of commands, done in order. The reply's JSON is a list with one result
+# per command. Region dumps go in the reply's binary part, and their result says where
+# ("offset"/"length", into the binary part). If a command fails, its result is {"error": ...}
+# and the commands after it are not run. A request that can't be read (bad lengths, not JSON, over
+# MAX_REQUEST) gets a single error result and then the connection is closed.
+#
+# Commands:
+#   {"op": "place", "element": "sand", "at": [x, y], "brush": 2}     also "line": [x1, y1, x2, y2]
+#   {"op": "fill", "element": "water", "rect": [x, y, w, h]}        or "polygon": [[x, y], ...], element null to erase
+#   {"op": "replace", "from": "water", "element": "ice", "rect": [x, y, w, h]}   or "polygon"
+#   {"op": "erase", "rect": [x, y, w, h]}                           or "polygon", or "at"/"line" like place
+#   {"op": "copy", "rect": [x, y, w, h]}  / "cut"                   into the clipboard (or "polygon")
+#   {"op": "paste", "at": [x, y], "transparent": true}              the clipboard, top left at x, y
+#   {"op": "stamp", "name": "reactor", "at": [x, y]}                a saved prefab (regions.STAMP_FOLDER)
+#   {"op": "save_stamp", "name": "reactor"}                         the clipboard as a prefab
+#   {"op": "step", "ticks": 100}                                    checks achievements after every tick
+#   {"op": "region", "rect": [x, y, w, h], "compress": true}        cells of the rect, one <H> per cell
+#                                                                  (x-major, packed like sim.cells), zlib'd if compress
+#   {"op": "stats"}                                                 tick, populations, placed, exploded, achievements
+#   {"op": "info"}                                                  size, tick, element names (index = id)
+#   {"op": "reset", "width": 160, "height": 88}                     empty world (and counters)
+
+DEFAULT_PORT = 5060
+LENGTH = struct.Struct("<I")
+MAX_REQUEST = 64 * 1024 * 1024  # Bytes, bigger length prefixes get an error instead of a 4 GB read
+
+clipboard = None
+
+def area(command):
+    if "polygon" in command:
+        return regions.polygon([tuple(p) for p in command["polygon"]])
+    return regions.rect(*command["rect"])
+
+def place(command, element):
+    item = {key: command[key] for key in ("at", "line", "rect", "brush") if key in command}
+    if not item.keys() & {"at", "line", "rect"}:
+        raise ValueError("Needs one of at, line, rect")
+    item["element"] = element
+    batch.place([item])
+
+def region(command, binary):
+    x, y, w, h = command["rect"]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(sim.W, x + w), min(sim.H, y + h)
+    grid = np.frombuffer(sim.cells, dtype=np.uint16).reshape(sim.W, sim.H)
+    data = grid[x0:max(x0, x1), y0:max(y0, y1)].astype('<u2').tobytes()
+    if command.get("compress"):
+        data = zlib.compress(data)
+    result = {"rect": [x0, y0, max(0, x1 - x0), max(0, y1 - y0)], "offset": len(binary), "length": len(data), "compressed": bool(command.get("compress"))}
+    binary += data
+    return result
+
+def stats():
+    return {
+        "tick": sim.tick,
+        "populations": {name: n for name, n in sim.populations().items() if n},
+        "placed": {name: n for name, n in sim.placed.items() if n},
+        "exploded": {name: n for name, n in sim.exploded.items() if n},
+        "achievement_counts": dict(sim.achievement_counts),
+        "achieved": [a for a, value in achievements.items() if value["achieved"]],
+    }
+
+def run_command(command, binary):
+    global clipboard
+    op = command.get("op")
+    if op == "place":
+        place(command, command["element"])
+        return {}
+    if op == "fill":
+        element = command.get("element")
+        if element is not None and element not in sim.element_ids:
+            raise ValueError(f"Unknown element: {element}")
+        return {"changed": regions.fill(area(command), element)}
+    if op == "replace":
+        for element in (command.get("from"), command.get("element")):
+            if element is not None and element not in sim.element_ids:
+                raise ValueError(f"Unknown element: {element}")
+        return {"changed": regions.replace(area(command), command.get("from"), command.get("element"))}
+    if op == "erase":
+        if "rect" in command or "polygon" in command:
+            return {"changed": regions.fill(area(command), None)}
+        place(command, None)
+        return {}
+    if op in ("copy", "cut"):
+        clipboard = regions.copy(area(command)) if op == "copy" else regions.cut(area(command))
+        return {"size": list(clipboard["cells"].shape)}
+    if op == "paste":
+        if clipboard is None:
+            raise ValueError("Nothing copied yet")
+        return {"changed": regions.paste(clipboard, *command["at"], transparent=command.get("transparent", True))}
+    if op == "stamp":
+        return {"changed": regions.stamp(command["name"], *command["at"])}
+    if op == "save_stamp":
+        if clipboard is None:
+            raise ValueError("Nothing copied yet")
+        regions.save_stamp(clipboard, command["name"])
+        return {}
+    if op == "step":
+        for _ in range(command.get("ticks", 1)):
+            sim.step()
+            sim.check_achievements()
+        return {"tick": sim.tick}
+    if op == "region":
+        return region(command, binary)
+    if op == "stats":
+        return stats()
+    if op == "info":
+        return {"width": sim.W, "height": sim.H, "tick": sim.tick, "elements": sim.element_names}
+    if op == "reset":
+        sim.reset_counters()
+        sim.reset(command.get("width", sim.W), command.get("height", sim.H))
+        return {}
+    raise ValueError(f"Unknown op: {op}")
+
+def run_commands(commands):
+    # (results, binary part)
+    results = []
+    binary = bytearray()
+    for command in commands:
+        try:
+            if not isinstance(command, dict):
+                raise TypeError(f"A command has to be an object, not {json.dumps(command)}")
+            results.append(run_command(command, binary))
+        except Exception as error:  # Any failure is that command's result, the connection stays up
+            results.append({"error": f"{type(error).__name__}: {error}"})
+            break
+    return results, bytes(binary)
+
+def pack(message, binary=b""):
+    text = json.dumps(message).encode()
+    return LENGTH.pack(LENGTH.size + len(text) + len(binary)) + LENGTH.pack(len(text)) + text + binary
+
+def unpack(body):
+    # body = everything after the first length
+    if len(body) < LENGTH.size:
+        raise ValueError(f"Body is {len(body)} bytes, too short for the JSON length")
+    text_length = LENGTH.unpack_from(body)[0]
+    if text_length > len(body) - LENGTH.size:
+        raise ValueError(f"JSON length {text_length} is past the end of the body")
+    return json.loads(body[LENGTH.size:LENGTH.size + text_length]), body[LENGTH.size + text_length:]
+
+async def handle(reader, writer):
+    try:
+        while True:
+            length = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+            if length > MAX_REQUEST:
+                raise ValueError(f"Request of {length} bytes is over the {MAX_REQUEST} byte limit")
+            commands, _ = unpack(await reader.readexactly(length))
+            if not isinstance(commands, list):
+                commands = [commands]
+            results, binary = run_commands(commands)  # All of it before the next client gets a turn
+            writer.write(pack(results, binary))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except (ValueError, struct.error) as error:  # Not JSON, or the framing is off, so we can't find the next request
+        writer.write(pack([{"error": f"Bad request: {error}"}]))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+async def serve(host, port, unix_path=None):
+    if unix_path:
+        server = await asyncio.start_unix_server(handle, unix_path)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+class Client:
+    # Blocking client for scripts: results, binary = client.send([...commands...])
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix_path)
+        else:
+            self.sock = socket.create_connection((host, port))
+
+    def receive(self, size):
+        data = bytearray()
+        while len(data) < size:
+            part = self.sock.recv(size - len(data))
+            if not part:
+                raise ConnectionError("Server went away")
+            data += part
+        return bytes(data)
+
+    def send(self, commands):
+        self.sock.sendall(pack(commands))
+        length = LENGTH.unpack(self.receive(LENGTH.size))[0]
+        return unpack(self.receive(length))
+
+    def region(self, x, y, w, h):
+        # Cells of a rect as a (w, h) numpy array of packed cells
+        results, binary = self.send([{"op": "region", "rect": [x, y, w, h], "compress": True}])
+        result = results[0]
+        if "error" in result:
+            raise ValueError(result["error"])
+        data = zlib.decompress(binary[result["offset"]:result["offset"] + result["length"]])
+        return np.frombuffer(data, dtype='<u2').reshape(result["rect"][2], result["rect"][3])
+
+    def close(self):
+        self.sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the sand world headless, controlled by scripts.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="Listen on this Unix socket instead")
+    parser.add_argument("--width", type=int, default=160, help="World width in cells")
+    parser.add_argument("--height", type=int, default=88, help="World height in cells")
+    parser.add_argument("--scenario", help="Start from a batch.py scenario file")
+    args = parser.parse_args()
+
+    if args.scenario:
+        batch.setup(batch.load_scenario(args.scenario))
+    else:
+        sim.reset(args.width, args.height)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
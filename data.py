@@ -18,7 +18,8 @@ data = {
         "density": 3,
         "flammable": True,
         "overrideburn": "steam", # When it burns, its steam, not the flaming
-        "flaming": False
+        "flaming": False,
+        "conductivity": 0.6,
     },
     "fire": {
         "name": "Fire",
@@ -33,7 +34,9 @@ data = {
         "enablefadingout": True,
         "flammable": False,
         "flaming": True,  # Fire can spread to flammable materials
-        "burn": 0.04 # slow burn rate (1%)
+        "burn": 0.04, # slow burn rate (1%)
+        "heat": 600, # Temperature it holds (see heat.py)
+        "conductivity": 0.3,
             },
     "stone": {
         "name": "Stone",
@@ -90,7 +93,7 @@ data = {
         "density": 2,  # Less dense than water
         "flammable": True,
         "flaming": False,
-        "burnm": 0.5
+        "burnm": 0.5,
     },
     "steam": {
         "name": "Steam",
@@ -128,6 +131,8 @@ data = {
         "flaming": True,  # Can ignite things
         "burn": 1, # Very igniting
         "overridemyburn": "fire", # When it burns, its fire, not lava. this is still overriden by the overrideburn
+        "heat": 1200, # Temperature it holds
+        "conductivity": 0.5,
         
     },
     "wall": {
@@ -151,6 +156,7 @@ data = {
         "flaming": False,
         "burnm": 0.5, # Acid burns slowly
         "corrode": True, # Acid can corrode other particles
+        "corrodechance": 0.1, # Chance per frame to eat a neighbour
         "excludecorrode": ["wall", "acid", "stone", "fire", "lava", "steam", "smoke"], # Exclude these particles from being corroded (flame starters, indestructible things, acid itself, gases)
     },
     "flamer": {
@@ -219,6 +225,10 @@ data = {
         "flammable": True,
         "overrideburn": "water",  # Melts into water when heated
         "flaming": False,
+        "heat": -20,  # Stays cold until it melts
+        "conductivity": 0.5,
+        "melt": [40, "water"],  # Melts when this warm (see heat.py)
+        "meltchance": 0.2,  # Chance per frame once it is warm enough
     },
     "plant": {
         "name": "Plant",
@@ -251,7 +261,7 @@ data = {
         "density": 1000,
         "flammable": False,
         "flaming": False,
-        "transmuteonpresence": ["water", "rust"], # Becomes rust if water is present
+        "conductivity": 0.9, # Carries heat well
     },
     "electricity": {
         "name": "Electricity",
@@ -275,10 +285,19 @@ data = {
         "density": 999999999,
         "flammable": False,
         "flaming": False,
-        "transmuteonpresence": ["electricity", "fire"], # Becomes fire if electricity is present
     },
 }
 
+# Things that happen when two elements touch (any of the 8 neighbours), checked on the first element's turn:
+# [element, neighbour, element becomes, neighbour becomes, chance per tick]   None = empty
+# ("transmuteonpresence": [neighbours, becomes] in an element still works too, it ends up in the same table)
+reactions = [
+    ["water", "lava", "steam", "obsidian", 1],
+    ["water", "salt", "water", None, 1],  # Dissolves salt (no salt element yet, so this is skipped)
+    ["metal", "water", "rust", "water", 1],  # Rusts
+    ["detonator", "electricity", "fire", "electricity", 1],
+]
+
 achievements = {
     "creator_bronze": {
         "name": "Creator! (Bronze)",
@@ -0,0 +1,206 @@
+import argparse
+import importlib
+import itertools
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import batch  # Scenario files
+import sim  # World + simulation rules
+import tracelog  # Reaction trace, for counting reactions per rule
+
+# Checks that a candidate engine behaves like the reference one (plain sim.step() with the default settings)
+#
+# Every engine runs the same scenario with the same seeds, spread over worker processes (a run starts
+# from sim's default settings, whatever ran before it in the same worker). Then:
+#   - populations per element over time (mean over seeds)
+#   - reactions per rule (from the reaction trace)
+#   - average height of each element (settling)
+#   - elements no reaction ever touched in the reference must keep exactly their starting count
+#   - with --exact (the candidate says it is deterministic): the cells must match the reference
+#     at every sample, and the first tick where a rule's count differs is reported
+#
+# A candidate is a comma separated list of sim settings, plus step=module:function to replace sim.step:
+#   python equiv.py scenarios/forest_fire.json --candidate update_order=alternate --candidate step=mymodule:step
+
+REL_TOLERANCE = 0.15  # Means further apart than this (relative) count as diverged...
+ABS_TOLERANCE = 5  # ...unless they are within this many particles / reactions
+
+defaults = {}  # sim setting -> its value before a candidate first changed it (in this process)
+
+def parse_engine(text):
+    # "update_order=alternate,step=module:function" -> engine dict
+    engine = {"name": text or "reference", "settings": {}, "step": None}
+    for part in filter(None, text.split(",")):
+        key, value = part.split("=", 1)
+        if key == "step":
+            engine["step"] = value
+            continue
+        if not hasattr(sim, key):
+            raise ValueError(f"sim has no setting called {key}")
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass  # Plain string
+        engine["settings"][key] = value
+    return engine
+
+def step_function(engine):
+    if not engine["step"]:
+        return sim.step
+    module, function = engine["step"].split(":")
+    return getattr(importlib.import_module(module), function)
+
+def run_engine(scenario, engine, seed, steps, sample_every, keep_cells):
+    # Workers get reused, so put back whatever an earlier run in this process changed
+    for key, value in defaults.items():
+        setattr(sim, key, value)
+    batch.restore_data()
+    batch.setup(scenario, seed)
+    for key, value in engine["settings"].items():
+        defaults.setdefault(key, getattr(sim, key))
+        setattr(sim, key, value)
+    step = step_function(engine)
+    tracelog.enable()
+
+    samples = []  # (tick, populations by id, average height by id)
+    snapshots = []  # cells bytes at each sample, if keep_cells
+    rule_ticks = []  # per tick: reactions per rule
+    seen = 0
+
+    def sample():
+        heights = [0.0] * len(sim.element_names)
+        for x in range(sim.W):
+            column = x * sim.H
+            for y in range(sim.H):
+                element = sim.cells[column + y] & sim.ID_MASK
+                if element:
+                    heights[element] += sim.H - y
+        samples.append((sim.tick, list(sim.counts), [h / n if n else 0.0 for h, n in zip(heights, sim.counts)]))
+        if keep_cells:
+            snapshots.append(sim.cells.tobytes())
+
+    sample()
+    for _ in range(steps):
+        step()
+        per_rule = [0] * len(tracelog.RULES)
+        if tracelog.count - seen > tracelog.size:
+            raise RuntimeError("More reactions in one tick than the trace buffer holds")
+        for k in range(seen, tracelog.count):
+            per_rule[(tracelog.events[k & tracelog.mask] >> 16) & 0xFF] += 1
+        seen = tracelog.count
+        rule_ticks.append(per_rule)
+        if sim.tick % sample_every == 0:
+            sample()
+    tracelog.disable()
+    return {"engine": engine["name"], "seed": seed, "samples": samples, "snapshots": snapshots, "rule_ticks": rule_ticks}
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+def diverged(reference, candidate):
+    return abs(candidate - reference) > max(ABS_TOLERANCE, REL_TOLERANCE * max(abs(reference), abs(candidate)))
+
+def touched_elements(runs):
+    # Element ids that were anywhere in a reaction, or whose count moved at all
+    touched = set()
+    for run in runs:
+        first = run["samples"][0][1]
+        for _, counts, _ in run["samples"]:
+            touched.update(e for e in range(1, len(counts)) if counts[e] != first[e])
+    return touched
+
+def compare(reference_runs, candidate_runs, exact):
+    # List of problems (strings), empty = equivalent
+    problems = []
+    names = sim.element_names
+    ref_by_seed = {r["seed"]: r for r in reference_runs}
+
+    # Populations, heights: mean over seeds at each sample
+    for k, (tick, _, _) in enumerate(reference_runs[0]["samples"]):
+        for element in range(1, len(names)):
+            ref = mean([r["samples"][k][1][element] for r in reference_runs])
+            cand = mean([r["samples"][k][1][element] for r in candidate_runs])
+            if diverged(ref, cand):
+                problems.append(f"population of {names[element]} at tick {tick}: {cand:.1f} vs {ref:.1f}")
+            ref_height = mean([r["samples"][k][2][element] for r in reference_runs if r["samples"][k][1][element]])
+            cand_height = mean([r["samples"][k][2][element] for r in candidate_runs if r["samples"][k][1][element]])
+            if ref_height and cand_height and diverged(ref_height, cand_height):
+                problems.append(f"height of {names[element]} at tick {tick}: {cand_height:.1f} vs {ref_height:.1f}")
+
+    # Reactions per rule over the whole run
+    for rule, rule_name in enumerate(tracelog.RULES):
+        ref = mean([sum(t[rule] for t in r["rule_ticks"]) for r in reference_runs])
+        cand = mean([sum(t[rule] for t in r["rule_ticks"]) for r in candidate_runs])
+        if diverged(ref, cand):
+            problems.append(f"rule {rule_name}: {cand:.1f} reactions per run vs {ref:.1f}")
+
+    # Mass conservation for what never reacted in the reference
+    inert = set(range(1, len(names))) - touched_elements(reference_runs)
+    for run in candidate_runs:
+        start = run["samples"][0][1]
+        for tick, counts, _ in run["samples"]:
+            for element in inert:
+                if counts[element] != start[element]:
+                    problems.append(f"{names[element]} is not conserved (seed {run['seed']}, tick {tick}: {counts[element]} vs {start[element]})")
+                    inert = inert - {element}
+
+    if exact:
+        for run in candidate_runs:
+            ref = ref_by_seed[run["seed"]]
+            for k, (tick, _, _) in enumerate(ref["samples"]):
+                if run["snapshots"][k] != ref["snapshots"][k]:
+                    problems.append(f"cells differ from the reference (seed {run['seed']}, first at tick {tick}, {differing_cells(ref['snapshots'][k], run['snapshots'][k])})")
+                    break
+            for t, (ref_rules, cand_rules) in enumerate(zip(ref["rule_ticks"], run["rule_ticks"])):
+                if ref_rules != cand_rules:
+                    rules = [tracelog.RULES[rule] for rule in range(len(ref_rules)) if ref_rules[rule] != cand_rules[rule]]
+                    problems.append(f"reactions differ from the reference (seed {run['seed']}, first at tick {t + 1}: {', '.join(rules)})")
+                    break
+    return problems
+
+def differing_cells(a, b):
+    # "12 cells: sand 7, water 5" by what the reference had there
+    by_element = {}
+    for k in range(0, len(a), 2):
+        if a[k:k + 2] != b[k:k + 2]:
+            name = sim.element_names[a[k]] or "empty"
+            by_element[name] = by_element.get(name, 0) + 1
+    total = sum(by_element.values())
+    return f"{total} cells: " + ", ".join(f"{name} {n}" for name, n in sorted(by_element.items(), key=lambda item: -item[1]))
+
+def check(scenario, candidates, seeds, steps, sample_every=10, exact=False, workers=None):
+    # {candidate name: problems} for every candidate engine
+    engines = [parse_engine("")] + candidates
+    jobs = list(itertools.product(engines, seeds))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        runs = list(pool.map(run_engine, itertools.repeat(scenario), [e for e, _ in jobs], [s for _, s in jobs],
+                             itertools.repeat(steps), itertools.repeat(sample_every), itertools.repeat(exact)))
+    reference_runs = [r for r in runs if r["engine"] == "reference"]
+    return {c["name"]: compare(reference_runs, [r for r in runs if r["engine"] == c["name"]], exact) for c in candidates}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check candidate engines against the reference simulation.")
+    parser.add_argument("scenario", help="Scenario JSON file (see batch.py)")
+    parser.add_argument("--candidate", action="append", required=True, help="Engine settings, like update_order=alternate (repeatable)")
+    parser.add_argument("--seeds", type=int, default=4, help="Runs per engine (seeds 0..n-1)")
+    parser.add_argument("--steps", type=int, help="Ticks per run (default: the scenario's)")
+    parser.add_argument("--sample-every", type=int, default=10, help="Ticks between samples")
+    parser.add_argument("--exact", action="store_true", help="Candidates must match the reference cell for cell")
+    parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: all cores)")
+    args = parser.parse_args()
+
+    scenario = batch.load_scenario(args.scenario)
+    steps = args.steps or scenario.get("steps", 1000)
+    results = check(scenario, [parse_engine(c) for c in args.candidate], list(range(args.seeds)), steps,
+                    args.sample_every, args.exact, args.workers)
+    failed = False
+    for name, problems in results.items():
+        if problems:
+            failed = True
+            print(f"{name}: {len(problems)} problems")
+            for problem in problems:
+                print(f"  {problem}")
+        else:
+            print(f"{name}: equivalent")
+    sys.exit(1 if failed else 0)
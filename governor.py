@@ -0,0 +1,89 @@
+import time
+from collections import deque
+
+# Decides how many sim steps to run and whether to draw, each time round the game loop
+#
+# The loop runs at FPS. At 1x/2x/4x the governor tries to do that many steps per loop, at max
+# it does as many as fit in the frame. It measures how long a step and a draw take (moving
+# averages) and when a frame would run over it first cuts steps, then skips drawing (but draws
+# at least MIN_DRAW_FPS times a second), so input is still read every loop.
+
+SPEEDS = [1, 2, 4, 0]  # Steps per frame, 0 = max
+SPEED_NAMES = {1: "1x", 2: "2x", 4: "4x", 0: "max"}
+MIN_DRAW_FPS = 15
+MAX_STEPS_PER_FRAME = 64  # Even at max, so one loop can't take forever
+SMOOTHING = 0.1  # Weight of the newest measurement in the moving averages
+
+fps = 60
+speed_index = 0
+step_cost = 0.0  # Seconds per sim step
+draw_cost = 0.0  # Seconds per draw
+last_draw = 0.0
+tick_times = deque()  # When recent steps finished, for the measured rate
+draw_times = deque()
+
+def set_fps(value):
+    global fps
+    fps = value
+
+def speed():
+    return SPEEDS[speed_index]
+
+def next_speed():
+    global speed_index
+    speed_index = (speed_index + 1) % len(SPEEDS)
+    return SPEED_NAMES[speed()]
+
+def budget():
+    return 1 / fps
+
+def steps_for_frame():
+    # How many steps to run this loop
+    room = budget() - draw_cost
+    fit = int(room / step_cost) if step_cost > 0 else MAX_STEPS_PER_FRAME
+    if speed() == 0:
+        return max(1, min(fit, MAX_STEPS_PER_FRAME))
+    return max(1, min(speed(), fit))
+
+def should_draw(steps_done):
+    # Draw if it fits in this frame, or if the screen has been stale for too long
+    now = time.perf_counter()
+    if steps_done * step_cost + draw_cost <= budget() or now - last_draw >= 1 / MIN_DRAW_FPS:
+        return True
+    return False
+
+def average(old, new):
+    return new if old == 0 else old + (new - old) * SMOOTHING
+
+def record_steps(seconds, steps):
+    global step_cost
+    if steps:
+        step_cost = average(step_cost, seconds / steps)
+        now = time.perf_counter()
+        tick_times.extend([now] * steps)
+        drop_old(tick_times, now)
+
+def record_draw(seconds):
+    global draw_cost, last_draw
+    draw_cost = average(draw_cost, seconds)
+    last_draw = time.perf_counter()
+    draw_times.append(last_draw)
+    drop_old(draw_times, last_draw)
+
+def drop_old(times, now):
+    # Keep the last second
+    while times and times[0] < now - 1:
+        times.popleft()
+
+def status(running):
+    # Text for the screen: measured vs target ticks per second, and draws per second
+    now = time.perf_counter()
+    drop_old(tick_times, now)
+    drop_old(draw_times, now)
+    if not running:
+        target = "paused"
+    elif speed() == 0:
+        target = "max"
+    else:
+        target = f"{speed() * fps}"
+    return f"{len(tick_times)} / {target} ticks/s  {len(draw_times)} fps  ({SPEED_NAMES[speed()]})"
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+
+import sim  # World + simulation rules
+import tracelog  # Reaction trace
+
+# Temperature field, one float per cell (same x-major layout as sim.cells)
+#
+# Every tick: heat spreads to the 4 neighbours (how fast depends on the cell's "conductivity"),
+# everything drifts back to AMBIENT a little, elements with a "heat" are held at that temperature,
+# and elements past a threshold change all at once:
+#   "melt": [temperature, element]   (ice)
+#   "boil": [temperature, element]   (water)
+#   "ignite": temperature            becomes its overrideburn, or fire
+# with "meltchance"/"boilchance"/"ignitechance" per tick once past it (default 1).
+# data.py only uses "melt" (ice, which had its own neighbour check in sim.fall_sand). Catching fire
+# stays the burn/burnm contact roll there and water already turns to steam through overrideburn and
+# the reactions table, so an "ignite" or "boil" on those would be a second way for the same thing.
+
+AMBIENT = 20.0
+AIR_CONDUCTIVITY = 0.1  # Empty cells
+DEFAULT_CONDUCTIVITY = 0.2
+COOLING = 0.01  # Fraction of the difference to AMBIENT lost per tick
+
+temperature = np.full((0, 0), AMBIENT, dtype=np.float32)
+
+# Built from data.py by compile_elements()
+conductivity = np.zeros(1, dtype=np.float32)  # By element id
+emits = np.zeros(1, dtype=np.float32)  # By element id, nan = no fixed temperature
+phase_rules = []  # (from id, threshold, to id, chance, tracelog rule)
+
+def compile_elements():
+    global conductivity, emits, phase_rules
+    conductivity = np.array([AIR_CONDUCTIVITY] + [p.get('conductivity', DEFAULT_CONDUCTIVITY) for p in sim.props[1:]], dtype=np.float32)
+    emits = np.array([np.nan] + [p.get('heat', np.nan) for p in sim.props[1:]], dtype=np.float32)
+    phase_rules = []
+    for element, p in enumerate(sim.props):
+        if not p:
+            continue
+        if 'melt' in p:
+            phase_rules.append((element, p['melt'][0], sim.element_ids[p['melt'][1]], p.get('meltchance', 1), tracelog.MELT))
+        if 'boil' in p:
+            phase_rules.append((element, p['boil'][0], sim.element_ids[p['boil'][1]], p.get('boilchance', 1), tracelog.BOIL))
+        if 'ignite' in p:
+            becomes = sim.burn_into[element] or sim.FIRE
+            phase_rules.append((element, p['ignite'], becomes, p.get('ignitechance', 1), tracelog.IGNITE))
+
+def reset(width, height):
+    global temperature
+    temperature = np.full((width, height), AMBIENT, dtype=np.float32)
+
+def step():
+    temp = temperature
+    if not temp.size:
+        return
+    flat = np.frombuffer(sim.cells, dtype=np.uint16)
+    ids = (flat & sim.ID_MASK).reshape(temp.shape)
+
+    # Spread: move towards the average of the 4 neighbours (edges count as themselves)
+    padded = np.pad(temp, 1, mode='edge')
+    around = (padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]) * 0.25
+    temp += conductivity[ids] * (around - temp)
+    temp += (AMBIENT - temp) * COOLING
+
+    # State changes past thresholds
+    hot = temp.reshape(-1)
+    ids_flat = ids.reshape(-1)
+    for element, threshold, becomes, chance, rule in phase_rules:
+        if not sim.counts[element]:
+            continue
+        candidates = np.flatnonzero((ids_flat == element) & (hot >= threshold))
+        if chance < 1:
+            candidates = [i for i in candidates.tolist() if random.random() < chance]
+        if len(candidates):
+            change(flat, np.asarray(candidates), element, becomes)
+            if sim.tracing:
+                for i in np.asarray(candidates).tolist():
+                    tracelog.record(sim.tick, rule, i, element, becomes)
+
+    # Heat sources hold their temperature (after the changes, so a melted cell is no longer one)
+    held = emits[(flat & sim.ID_MASK).reshape(temp.shape)]
+    sources = ~np.isnan(held)
+    temp[sources] = held[sources]
+
+def change(flat, where, element, becomes):
+    # Turn the cells at flat indexes `where` from element into becomes, all in one go
+    p = sim.props[becomes]
+    if 'slife' in p:
+        if isinstance(p['slife'], tuple):
+            lives = np.array([random.randint(p['slife'][0], p['slife'][1]) for _ in range(len(where))], dtype=np.uint16)
+        else:
+            lives = np.full(len(where), p['slife'], dtype=np.uint16)
+        flat[where] = becomes | (np.minimum(lives, sim.MAX_LIFE) << sim.LIFE_SHIFT)
+    else:
+        flat[where] = (flat[where] & sim.LIFE_MASK) | becomes
+    sim.counts[element] -= len(where)
+    sim.counts[becomes] += len(where)
+    sim.mark_cells(where)
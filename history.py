@@ -0,0 +1,135 @@
+from array import array
+
+import sim  # World + simulation rules
+
+# Undo/redo for the world
+#
+# A snapshot is the world cut into chunks of CHUNK_COLUMNS columns (each one a bytes copy of
+# that part of sim.cells). Chunks that didn't change since the last snapshot are not copied,
+# the new snapshot just points at the old bytes object, so a stroke only costs the chunks it touched.
+# When all snapshots together use more than memory_budget bytes, the oldest ones get dropped.
+# With a world on disk (chunkstore.py) sim.cells is only a window of it, which moves with the camera.
+# Snapshots remember where the window was (window_at()), undo/redo move it back there first
+# (move_window()), so undo still works after panning. chunkstore sets both.
+
+CHUNK_COLUMNS = 8
+MEMORY_BUDGET = 64 * 1024 * 1024  # Bytes
+
+memory_budget = MEMORY_BUDGET
+undo_stack = []  # Oldest first
+redo_stack = []  # Most recently undone last
+last_chunks = None  # Chunks of the snapshot the world was last saved as / restored from
+memory_used = 0
+chunk_refs = {}  # id(chunk bytes) -> [number of snapshots using it, size]
+window_at = None
+move_window = None
+
+def chunk_bounds():
+    # (start, end) byte offsets of every chunk in sim.cells
+    step = CHUNK_COLUMNS * sim.H * sim.cells.itemsize
+    total = len(sim.cells) * sim.cells.itemsize
+    return [(start, min(start + step, total)) for start in range(0, total, step)]
+
+def take_snapshot(label):
+    global last_chunks
+    raw = memoryview(sim.cells).cast('B')
+    previous = last_chunks if last_chunks and len(last_chunks) == len(chunk_bounds()) else None
+    chunks = []
+    for k, (start, end) in enumerate(chunk_bounds()):
+        part = raw[start:end]
+        if previous is not None and part == previous[k]:
+            chunks.append(previous[k])  # Unchanged, share it
+        else:
+            chunks.append(bytes(part))
+    raw.release()
+    last_chunks = chunks
+    window = window_at() if window_at else None
+    return {"label": label, "size": (sim.W, sim.H), "window": window, "chunks": chunks, "ctype": dict(sim.ctype)}
+
+def add_refs(snapshot):
+    global memory_used
+    for chunk in snapshot["chunks"]:
+        ref = chunk_refs.get(id(chunk))
+        if ref:
+            ref[0] += 1
+        else:
+            chunk_refs[id(chunk)] = [1, len(chunk)]
+            memory_used += len(chunk)
+
+def drop_refs(snapshot):
+    global memory_used
+    for chunk in snapshot["chunks"]:
+        ref = chunk_refs[id(chunk)]
+        ref[0] -= 1
+        if ref[0] == 0:
+            del chunk_refs[id(chunk)]
+            memory_used -= ref[1]
+
+def push(stack, snapshot):
+    stack.append(snapshot)
+    add_refs(snapshot)
+
+def pop(stack, index=-1):
+    snapshot = stack.pop(index)
+    drop_refs(snapshot)
+    return snapshot
+
+def evict():
+    # Oldest first, keep at least the newest undo step
+    while memory_used > memory_budget and len(undo_stack) > 1:
+        pop(undo_stack, 0)
+    while memory_used > memory_budget and redo_stack:
+        pop(redo_stack, 0)
+
+def restore(snapshot):
+    global last_chunks
+    if (sim.W, sim.H) != snapshot["size"]:
+        sim.reset(*snapshot["size"])
+    cells = array('H')
+    cells.frombytes(b"".join(snapshot["chunks"]))
+    sim.cells[:] = cells
+    sim.mark_columns(0, sim.W)
+    sim.ctype = dict(snapshot["ctype"])
+    sim.recount()
+    last_chunks = snapshot["chunks"]
+
+def go_to_window(snapshot):
+    # Before the redo/undo snapshot is taken, so that one is of the same part of the world
+    if snapshot["window"] is not None and window_at and window_at() != snapshot["window"]:
+        move_window(*snapshot["window"])
+
+def checkpoint(label=""):
+    # Call before changing the world (a stroke, a clear, an explosion), so undo can go back to now
+    while redo_stack:
+        pop(redo_stack)
+    push(undo_stack, take_snapshot(label))
+    evict()
+
+def undo():
+    # Back to the last checkpoint, returns its label or None if there is nothing to undo
+    if not undo_stack:
+        return None
+    go_to_window(undo_stack[-1])
+    push(redo_stack, take_snapshot(undo_stack[-1]["label"]))
+    snapshot = pop(undo_stack)
+    restore(snapshot)
+    evict()
+    return snapshot["label"]
+
+def redo():
+    if not redo_stack:
+        return None
+    go_to_window(redo_stack[-1])
+    push(undo_stack, take_snapshot(redo_stack[-1]["label"]))
+    snapshot = pop(redo_stack)
+    restore(snapshot)
+    evict()
+    return snapshot["label"]
+
+def clear():
+    global last_chunks
+    while undo_stack:
+        pop(undo_stack)
+    while redo_stack:
+        pop(redo_stack)
+    last_chunks = None
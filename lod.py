@@ -0,0 +1,88 @@
+import numpy as np
+
+import sim  # World + simulation rules
+
+# Colour mipmaps of the world, for drawing it zoomed out
+#
+# levels[0] is the colour of every cell (x-major like sim.cells, white where empty, faded by life
+# like the old per-cell drawing), levels[k] averages 2x2 blocks of levels[k-1]. update() only
+# redoes the chunks (CHUNK_COLUMNS wide column bands) that sim marked dirty since the last update,
+# so it costs what changed, not the size of the world (nothing at all while paused).
+
+CHUNK_COLUMNS = sim.DIRTY_COLUMNS  # Must be a multiple of 2 ** MAX_LEVEL so chunks line up on every level
+MAX_LEVEL = 5
+BACKGROUND = 255
+
+levels = []
+size = (0, 0)
+colors = np.zeros((1, 3), dtype=np.float32)  # By element id
+fades = np.zeros(1, dtype=bool)
+max_lives = np.ones(1, dtype=np.float32)
+
+def compile_elements():
+    global colors, fades, max_lives
+    colors = np.array([(BACKGROUND,) * 3] + [p['color'] for p in sim.props[1:]], dtype=np.float32)
+    fades = np.array([False] + [('slife' in p and p.get('enablefadingout', True)) for p in sim.props[1:]])
+    max_lives = np.array([1] + [p.get('mlife', 1) for p in sim.props[1:]], dtype=np.float32)
+
+def rebuild():
+    # World changed size (or first use): start over
+    global levels, size
+    compile_elements()
+    size = (sim.W, sim.H)
+    levels = []
+    w, h = size
+    for k in range(MAX_LEVEL + 1):
+        levels.append(np.full((w, h, 3), BACKGROUND, dtype=np.uint8))
+        w, h = (w + 1) // 2, (h + 1) // 2
+    sim.mark_columns(0, sim.W)
+
+def color_columns(start, end):
+    # levels[0] for columns start..end
+    cells = np.frombuffer(sim.cells, dtype=np.uint16).reshape(sim.W, sim.H)[start:end]
+    ids = cells & sim.ID_MASK
+    rgb = colors[ids]
+    fading = fades[ids]
+    if fading.any():
+        alpha = np.where(fading, np.minimum((cells >> sim.LIFE_SHIFT) / max_lives[ids], 1), 1)
+        rgb = BACKGROUND + (rgb - BACKGROUND) * alpha[..., None]
+    levels[0][start:end] = rgb.astype(np.uint8)
+
+def downsample(src):
+    # Average 2x2 blocks, odd edges repeat themselves
+    w, h = src.shape[:2]
+    if w % 2 or h % 2:
+        src = np.pad(src, ((0, w % 2), (0, h % 2), (0, 0)), mode='edge')
+    s = src.astype(np.uint16)
+    return ((s[0::2, 0::2] + s[1::2, 0::2] + s[0::2, 1::2] + s[1::2, 1::2]) // 4).astype(np.uint8)
+
+def update():
+    # Bring the mipmaps up to date with sim.cells, returns how many chunks were redone
+    if size != (sim.W, sim.H) or not levels:
+        rebuild()
+    bands = sorted(sim.dirty)
+    sim.dirty.clear()
+    for k in bands:
+        start = k * CHUNK_COLUMNS
+        end = min(start + CHUNK_COLUMNS, sim.W)
+        color_columns(start, end)
+        for level in range(1, MAX_LEVEL + 1):
+            start, end = start // 2, (end + 1) // 2
+            levels[level][start:end] = downsample(levels[level - 1][start * 2:end * 2])
+    return len(bands)
+
+def level_for(zoom):
+    # Pick the level where about one texel lands on one pixel (zoom = pixels per cell)
+    level = 0
+    while level < MAX_LEVEL and zoom * (2 ** (level + 1)) <= 1:
+        level += 1
+    return level
+
+def view(x, y, width, height, zoom):
+    # Colours of the cells in the rectangle x, y, width, height (cells) as seen at this zoom.
+    # Returns (array, level): each texel of the array covers 2 ** level cells per side.
+    level = level_for(zoom)
+    scale = 2 ** level
+    x0, y0 = max(0, x // scale), max(0, y // scale)
+    x1, y1 = -(-(x + width) // scale), -(-(y + height) // scale)
+    return levels[level][x0:x1, y0:y1], level
@@ -0,0 +1,611 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from data import data
+import batch  # Scenario files, result tables
+import equiv  # Tolerances for compare()
+import heat  # Temperature constants and phase rules
+import sim  # World + simulation rules
+
+# Many small worlds (same scenario, different seeds / parameters) stepped together, for batch.py --multi
+#
+# The worlds are stacked into arrays with a leading world axis: ids and lives are (N, W, H),
+# x-major like sim.cells. Each rule is one set of numpy passes over all of them, instead of
+# sim.fall_sand's loop over every particle of every world.
+# Moves are done in 4 phases by (x % 2, y % 2) so no two particles ever go for the same cell, and a
+# particle that moved is done for the tick (like sim.evaluate_once).
+#
+# It does every rule sim.step does: life running out, the reactions table, electricity (with the
+# ctypes as a plane that moves with the particles), burning (overrideburn, dynamite blasts), plants,
+# acid, cloners, falling / flowing / rising / gas moves by density, and heat. Not achievements.
+# Cells that were empty at the start of the tick get no go (like sim.evaluate_once). Each tick every
+# cell gets a random place in the order (like sim.fall_sand's shuffled order): fire or electricity made
+# in one go gets its own go the same tick if it comes later, and particles move in groups by it.
+# It is statistically close to sim.step, not tick for tick the same. python multiworld.py SCENARIO
+# (compare()) checks population curves against the normal engine, scenarios/all_rules.json uses every rule.
+# Per world parameters (sweep / params): PER_WORLD keys of any element. Everything else has to be the same for every world.
+# Seeds: a world's seed only picks its placement (batch.setup). After that every world draws from one
+# generator for the whole batch, seeded from all the worlds' seeds, so the same scenario reproduces the
+# whole batch but a result row's seed doesn't reproduce that run on its own (not like batch.run_one).
+
+PER_WORLD = {"burn", "burnm", "slife", "density", "corrodechance"}
+ACID_USED_UP = 0.01  # Same as sim.fall_sand
+CASCADE = 0.5  # Chance a cell's go comes after a neighbour's, see reaction_pass()
+MOVE_GROUPS = 4  # See move_pass()
+NOISE = 4  # Standard errors a mean has to be off by in compare() (it makes hundreds of comparisons)
+
+PLANT_GROW = 0.001  # Same as sim.fall_sand
+PLANT_DRINK_BLOCKED = 0.05
+CLONE_PLANT = 0.05
+CLONE_PLANT_DOWN = 0.3
+CLONE = 0.8
+CONDUCTED_LIFE = 2
+COOLDOWN = 10
+
+# Rules, the same for every world (from the first world's data)
+pours = np.zeros(256, dtype=bool)  # Falls down (powders and liquids)
+flows = np.zeros(256, dtype=bool)  # Also goes sideways (liquids)
+rises = np.zeros(256, dtype=bool)  # Goes up (fire)
+drifts = np.zeros(256, dtype=bool)  # Any way (gas)
+flaming = np.zeros(256, dtype=bool)
+flammable = np.zeros(256, dtype=bool)
+corrodes = np.zeros(256, dtype=bool)
+conducts = np.zeros(256, dtype=bool)
+clone_into = np.zeros(256, dtype=np.uint8)
+exclude_corrode = np.zeros((256, 256), dtype=bool)
+burn_into = np.zeros(256, dtype=np.uint8)
+my_burn_into = np.zeros(256, dtype=np.uint8)
+explode_radius = np.zeros(256, dtype=np.int16)
+shatter_into = np.zeros(256, dtype=np.uint8)
+no_explode_fire = np.zeros(256, dtype=bool)
+life_effect = np.zeros(256, dtype=np.int8)  # 0 none, 1 die, 2 become
+life_into = np.zeros(256, dtype=np.uint8)
+reacts = np.zeros(256, dtype=bool)
+reaction_into = np.zeros((256, 256, 2), dtype=np.uint8)
+reaction_chance = np.zeros((256, 256), dtype=np.float64)
+conductivity = np.zeros(256, dtype=np.float32)
+emits = np.full(256, np.nan, dtype=np.float32)
+
+# Per world: [world, id]
+burn = np.zeros((0, 256))
+burnm = np.zeros((0, 256))
+density = np.zeros((0, 256))
+corrode_chance = np.zeros((0, 256))
+slife_low = np.zeros((0, 256), dtype=np.int64)
+slife_high = np.zeros((0, 256), dtype=np.int64)
+has_slife = np.zeros((0, 256), dtype=bool)
+
+# The worlds
+ids = np.zeros((0, 0, 0), dtype=np.uint8)
+lives = np.zeros((0, 0, 0), dtype=np.int16)
+ctypes = np.zeros((0, 0, 0), dtype=np.uint8)  # What electricity was before it, 0 = nothing (sim.ctype)
+temperature = np.zeros((0, 0, 0), dtype=np.float32)  # Stays put when particles move, like heat.temperature
+moved = np.zeros((0, 0, 0), dtype=bool)
+arrived = np.zeros((0, 0, 0), dtype=bool)  # Where a particle moved to this tick
+vacated = np.zeros((0, 0, 0), dtype=bool)  # Where a particle moved from this tick
+order = np.zeros((0, 0, 0))  # Set by step()
+behind = np.zeros((0, 0, 0), dtype=np.uint8)  # See move()
+world = np.zeros((0, 1, 1), dtype=np.int64)  # World index, shaped to broadcast against (N, W, H)
+exploded = []  # Per world: {element name: count}
+tick = 0
+rng = np.random.default_rng()
+
+def compile_rules():
+    # Shared rule tables from sim's (already compiled) tables
+    global pours, flows, rises, drifts, flaming, flammable, corrodes, conducts, clone_into, exclude_corrode, burn_into, my_burn_into
+    global explode_radius, shatter_into, no_explode_fire, life_effect, life_into, reacts, reaction_into, reaction_chance
+    global conductivity, emits
+    n = len(sim.element_names)
+    fall = np.zeros(256, dtype=np.int8)
+    flaming = np.zeros(256, dtype=bool)
+    flammable = np.zeros(256, dtype=bool)
+    corrodes = np.zeros(256, dtype=bool)
+    exclude_corrode = np.zeros((256, 256), dtype=bool)
+    explode_radius = np.zeros(256, dtype=np.int16)
+    life_effect = np.zeros(256, dtype=np.int8)
+    life_into = np.zeros(256, dtype=np.uint8)
+    for element in range(1, n):
+        p = sim.props[element]
+        fall[element] = p.get('fall', 0)
+        flaming[element] = p.get('flaming', False)
+        flammable[element] = p.get('flammable', False)
+        corrodes[element] = p.get('corrode', False)
+        exclude_corrode[element, list(sim.exclude_corrode[element])] = True
+        explode_radius[element] = p.get('exploderad', 0) or 0
+        if sim.life0[element]:
+            effect, into = sim.life0[element]
+            life_effect[element] = 1 if effect == "die" else 2
+            life_into[element] = into
+    pours = (fall == 1) | (fall == 2)
+    flows = fall == 2
+    rises = fall == -1
+    drifts = fall == 3
+    burn_into = np.zeros(256, dtype=np.uint8)
+    burn_into[:n] = sim.burn_into
+    my_burn_into = np.zeros(256, dtype=np.uint8)
+    my_burn_into[:n] = sim.my_burn_into
+    shatter_into = np.zeros(256, dtype=np.uint8)
+    shatter_into[:n] = sim.shatter_into
+    no_explode_fire = np.zeros(256, dtype=bool)
+    no_explode_fire[list(sim.no_explode_fire)] = True
+    conducts = np.zeros(256, dtype=bool)
+    conducts[list(sim.conducts)] = True
+    clone_into = np.zeros(256, dtype=np.uint8)
+    clone_into[:n] = sim.clone_into
+    reaction_into = np.zeros((256, 256, 2), dtype=np.uint8)
+    reaction_chance = np.zeros((256, 256), dtype=np.float64)
+    for k, reaction in enumerate(sim.reaction_table):
+        if reaction:
+            element, neighbour = divmod(k, n)
+            reaction_into[element, neighbour] = reaction[:2]
+            reaction_chance[element, neighbour] = reaction[2]
+    reacts = reaction_chance.any(axis=1)
+    conductivity = np.full(256, heat.AIR_CONDUCTIVITY, dtype=np.float32)
+    conductivity[:n] = heat.conductivity
+    emits = np.full(256, np.nan, dtype=np.float32)
+    emits[:n] = heat.emits
+
+def world_parameters():
+    # This world's PER_WORLD values from sim.props, as rows of 256
+    rows = {key: np.zeros(256) for key in ("burn", "burnm", "density", "corrodechance")}
+    low, high, has = np.zeros(256, dtype=np.int64), np.zeros(256, dtype=np.int64), np.zeros(256, dtype=bool)
+    for element in range(1, len(sim.element_names)):
+        p = sim.props[element]
+        rows["burn"][element] = p.get('burn', 0.01)
+        rows["burnm"][element] = p.get('burnm', 0.01)
+        rows["density"][element] = p.get('density', 1)
+        rows["corrodechance"][element] = p.get('corrodechance', 0.1)
+        if 'slife' in p:
+            has[element] = True
+            low[element], high[element] = p['slife'] if isinstance(p['slife'], (list, tuple)) else (p['slife'], p['slife'])
+    return rows, low, high, has
+
+def structure():
+    # Everything that has to match between worlds
+    return (sim.reaction_table, sim.life0, sim.burn_into, sim.my_burn_into, sim.shatter_into, sim.exclude_corrode,
+            heat.phase_rules, [{k: v for k, v in p.items() if k not in PER_WORLD} for p in sim.props[1:]])
+
+def setup(scenario, jobs, seed=0):
+    # One world per job (run, seed, params), built with batch.setup like a normal run
+    global ids, lives, ctypes, temperature, moved, arrived, vacated, behind, world, exploded, tick, rng
+    global burn, burnm, density, corrode_chance, slife_low, slife_high, has_slife
+    stack_ids, stack_lives, stack_ctypes, rows, first = [], [], [], [], None
+    for run, world_seed, params in jobs:
+        bad = [path for path in params if path.split(".", 1)[1] not in PER_WORLD]
+        if bad:
+            raise ValueError(f"multiworld can only vary {', '.join(sorted(PER_WORLD))} per world, not {', '.join(bad)}")
+        batch.restore_data()
+        batch.setup(scenario, world_seed, params)
+        if first is None:
+            first = structure()
+            compile_rules()
+        elif structure() != first:
+            raise ValueError("Worlds differ in more than per world parameters")
+        cells = np.frombuffer(sim.cells, dtype=np.uint16).reshape(sim.W, sim.H)
+        stack_ids.append((cells & sim.ID_MASK).astype(np.uint8))
+        stack_lives.append((cells >> sim.LIFE_SHIFT).astype(np.int16))
+        plane = np.zeros(cells.shape, dtype=np.uint8)
+        for i, element in sim.ctype.items():
+            plane[divmod(i, sim.H)] = element
+        stack_ctypes.append(plane)
+        rows.append(world_parameters())
+    ids = np.stack(stack_ids)
+    lives = np.stack(stack_lives)
+    ctypes = np.stack(stack_ctypes)
+    temperature = np.full(ids.shape, heat.AMBIENT, dtype=np.float32)
+    moved = np.zeros(ids.shape, dtype=bool)
+    arrived = np.zeros(ids.shape, dtype=bool)
+    vacated = np.zeros(ids.shape, dtype=bool)
+    behind = np.zeros(ids.shape, dtype=np.uint8)
+    world = np.arange(len(jobs)).reshape(-1, 1, 1)
+    burn = np.stack([r[0]["burn"] for r in rows])
+    burnm = np.stack([r[0]["burnm"] for r in rows])
+    density = np.stack([r[0]["density"] for r in rows])
+    corrode_chance = np.stack([r[0]["corrodechance"] for r in rows])
+    slife_low = np.stack([r[1] for r in rows])
+    slife_high = np.stack([r[2] for r in rows])
+    has_slife = np.stack([r[3] for r in rows])
+    exploded = [{name: 0 for name in data} for _ in jobs]
+    tick = 0
+    rng = np.random.default_rng([seed] + [world_seed for _, world_seed, _ in jobs])  # See the top
+
+def around(where, dx, dy):
+    # where = (worlds, xs, ys) of some cells. Returns (the ones with a cell dx, dy away, those cells).
+    w, x, y = where
+    nx, ny = x + dx, y + dy
+    inside = (nx >= 0) & (nx < ids.shape[1]) & (ny >= 0) & (ny < ids.shape[2])
+    return (w[inside], x[inside], y[inside]), (w[inside], nx[inside], ny[inside])
+
+def pick(where, mask):
+    return tuple(a[mask] for a in where)
+
+def become(where, new):
+    # Cells at where (worlds, xs, ys) turn into new (an id, or one per cell), with a fresh life if it
+    # has one. Life otherwise stays, like sim.set_element.
+    w = where[0]
+    new = np.broadcast_to(np.asarray(new, dtype=np.uint8), w.shape)
+    ids[where] = new
+    living = has_slife[w, new]
+    if living.any():
+        fresh = lives[where]
+        fresh[living] = np.minimum(rng.integers(slife_low[w, new][living], slife_high[w, new][living] + 1), sim.MAX_LIFE)
+        lives[where] = fresh
+
+def life_pass():
+    effect = life_effect[ids]
+    counting = effect != 0
+    lives[counting] -= 1
+    expired = counting & (lives <= 0)
+    dies = expired & (effect == 1)
+    ids[dies] = 0
+    lives[dies] = 0
+    turns = expired & (effect == 2)
+    if turns.any():
+        lives[turns] = 0
+        where = np.nonzero(turns)
+        become(where, life_into[ids[where]])
+
+def reaction_pass(late=False):
+    # The reactions table, one direction at a time (every cell looks at the same neighbour at once).
+    # Like sim.fall_sand a cell keeps going through its neighbours as what it was at the start of its
+    # go, so one water can turn several lava into obsidian. A cell changed by a neighbour's reaction
+    # is done. late: after the moves. In sim a cell whose go comes after a particle moved in next to it
+    # reacts with it the same tick, so cells that haven't moved get another look at new neighbours
+    # (with a chance of CASCADE for their go coming later).
+    tile = ids.copy()
+    acting = reacts[tile]
+    if late:
+        acting &= ~moved & (rng.random(ids.shape) < CASCADE)
+    for dx, dy in sim.NEIGHBOURS:
+        if not acting.any():
+            return
+        src, dst = around(np.nonzero(acting), dx, dy)
+        if late:
+            new = arrived[dst]
+            src, dst = pick(src, new), pick(dst, new)
+        element, other = tile[src], ids[dst]
+        chance = reaction_chance[element, other]
+        hit = (chance > 0) & ((chance >= 1) | (rng.random(len(chance)) < chance))
+        if not hit.any():
+            continue
+        src, dst, element, other = pick(src, hit), pick(dst, hit), element[hit], other[hit]
+        into = reaction_into[element, other]
+        mine = into[:, 0] != ids[src]
+        become(pick(src, mine), into[mine, 0])
+        theirs = into[:, 1] != other
+        ids[pick(dst, theirs)] = into[theirs, 1]
+        acting[pick(dst, theirs)] = False
+        theirs &= into[:, 1] != 0
+        become(pick(dst, theirs), into[theirs, 1])
+
+def burn_pass():
+    # In sim.fall_sand a cell that catches fire still gets its go that tick if it comes later in the
+    # order (so fire can run through gunpowder), and if not it stays put until the next tick. Same here
+    # with the tick's order: rounds of spreading, a cell lit in one round spreads in the next if it comes
+    # after the one that lit it, the others are marked as moved.
+    lit = np.nonzero(flaming[ids])
+    while len(lit[0]):
+        caught = np.zeros(ids.shape, dtype=bool)
+        later = np.zeros(ids.shape, dtype=bool)
+        for dx, dy in sim.NEIGHBOURS:
+            src, dst = around(lit, dx, dy)
+            tile, target = ids[src], ids[dst]
+            catches = flaming[tile] & flammable[target] & (rng.random(len(target)) < burn[src[0], tile] * burnm[src[0], target])
+            if not catches.any():
+                continue
+            src, dst, tile, target = pick(src, catches), pick(dst, catches), tile[catches], target[catches]
+            # overrideburn of the target, else overridemyburn of the source, else the source
+            new = np.where(burn_into[target] != 0, burn_into[target], np.where(my_burn_into[tile] != 0, my_burn_into[tile], tile))
+            burns = explode_radius[target] == 0
+            become(pick(dst, burns), new[burns])
+            caught[pick(dst, burns)] = True
+            later[pick(dst, burns)] = order[pick(dst, burns)] > order[pick(src, burns)]
+            for w, x, y in zip(*pick(dst, ~burns)):
+                blast(w, x, y)
+        moved[caught & ~later] = True
+        lit = np.nonzero(caught & later)
+        lit = pick(lit, flaming[ids[lit]])
+
+def blast(w, x, y):
+    # Dynamite going off, like sim.fall_sand
+    radius = int(explode_radius[ids[w, x, y]])
+    if not radius:
+        return  # Already went off (or got blown up) this tick
+    ox, oy = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = (ox * ox + oy * oy <= radius * radius)
+    xs, ys = (x + ox)[inside], (y + oy)[inside]
+    keep = (xs >= 0) & (xs < ids.shape[1]) & (ys >= 0) & (ys < ids.shape[2])
+    xs, ys = xs[keep], ys[keep]
+    hit = ids[w, xs, ys]
+    shatters = (hit != 0) & (shatter_into[hit] != 0)
+    for element, n in zip(*np.unique(hit[shatters], return_counts=True)):
+        exploded[w][sim.element_names[element]] += int(n)
+    become((np.full(shatters.sum(), w), xs[shatters], ys[shatters]), shatter_into[hit[shatters]])
+    fires = ~shatters & (rng.random(len(hit)) < 0.1) & ~no_explode_fire[hit]
+    become((np.full(fires.sum(), w), xs[fires], ys[fires]), sim.FIRE)
+    become((np.array([w]), np.array([x]), np.array([y])), sim.LAVA if rng.random() < 0.2 else sim.FIRE)
+
+def cooldown_pass():
+    # Conductors that carried electricity lately count their cooldown down (before the electricity
+    # goes, so one that gets to 0 can carry again this tick)
+    cooling = conducts[ids] & (lives > 0)
+    lives[cooling] -= 1
+
+def electricity_pass():
+    # Electricity spreads into conductors that aren't cooling down, then runs down its own life and
+    # turns back into its ctype (cooling down) or nothing. Like burn_pass, electricity made this tick
+    # goes this tick too if it comes after the one that made it.
+    going = np.nonzero(ids == sim.ELECTRICITY)
+    while len(going[0]):
+        made = np.zeros(ids.shape, dtype=bool)
+        for dx, dy in sim.NEIGHBOURS:
+            src, dst = around(going, dx, dy)
+            target = ids[dst]
+            carries = (ids[src] == sim.ELECTRICITY) & conducts[target] & (lives[dst] <= 0)
+            src, dst = pick(src, carries), pick(dst, carries)
+            ctypes[dst] = target[carries]
+            ids[dst] = sim.ELECTRICITY
+            lives[dst] = CONDUCTED_LIFE
+            made[dst] = order[dst] > order[src]
+        going = pick(going, ids[going] == sim.ELECTRICITY)
+        life = lives[going] - 1
+        ended = life <= 0
+        lives[pick(going, ~ended)] = life[~ended]
+        end = pick(going, ended)
+        was = ctypes[end]
+        ids[end] = was
+        lives[end] = np.where(was != 0, COOLDOWN, 0)
+        ctypes[end] = 0
+        going = np.nonzero(made)
+
+def plant_pass():
+    # Plants with room above drink a neighbouring water (left, right, below, first found) and grow up,
+    # or without water grow now and then. Blocked ones sometimes drink anyway and grow over what's above
+    # (at the top they grow at the bottom of their column, like sim.fall_sand).
+    w, x, y = np.nonzero(ids == sim.PLANT)
+    if not len(w):
+        return
+    up = np.where(y > 0, y - 1, ids.shape[2] - 1)
+    free = (y > 0) & (ids[w, x, up] == 0)
+    looking = free | (rng.random(len(w)) < PLANT_DRINK_BLOCKED)
+    drank = np.zeros(len(w), dtype=bool)
+    for dx, dy in ((-1, 0), (1, 0), (0, 1)):
+        nx, ny = x + dx, y + dy
+        water = looking & ~drank & (nx >= 0) & (nx < ids.shape[1]) & (ny < ids.shape[2])
+        water[water] = ids[w[water], nx[water], ny[water]] == sim.WATER
+        ids[w[water], nx[water], ny[water]] = 0
+        drank |= water
+    grows = drank | (free & (rng.random(len(w)) < PLANT_GROW))
+    become((w[grows], x[grows], up[grows]), sim.PLANT)
+
+def acid_pass():
+    for dx, dy in sim.NEIGHBOURS:
+        sources = corrodes[ids]
+        if not sources.any():
+            return
+        src, dst = around(np.nonzero(sources), dx, dy)
+        acid, target = ids[src], ids[dst]
+        touching = (target != 0) & ~exclude_corrode[acid, target]
+        roll = rng.random(len(target))
+        eats = touching & (roll < corrode_chance[src[0], acid])
+        used_up = touching & ~eats & (rng.random(len(target)) < ACID_USED_UP)
+        ids[pick(dst, eats)] = 0
+        ids[pick(src, used_up)] = 0
+
+def clone_pass(late=False):
+    # Cloners fill empty neighbours with their clone (plants mostly upwards, and rarely).
+    # late: after the moves, into the cells a particle left before the cloner's go in the tick's order
+    # (in sim.fall_sand those were empty by the time the cloner looked).
+    for dx, dy in sim.NEIGHBOURS:
+        sources = clone_into[ids] != 0
+        if not sources.any():
+            return
+        src, dst = around(np.nonzero(sources), dx, dy)
+        if late:
+            left = vacated[dst] & (order[dst] < order[src])
+            src, dst = pick(src, left), pick(dst, left)
+        tile = ids[src]
+        roll = rng.random(len(tile))
+        plant = tile == sim.PLANT
+        chance = np.where(plant, (roll < CLONE_PLANT) & ((dy <= 0) | (rng.random(len(tile)) < CLONE_PLANT_DOWN)), roll < CLONE)
+        clones = (ids[dst] == 0) & chance
+        become(pick(dst, clones), clone_into[tile[clones]])
+
+def move(kinds, cells, dx, dy):
+    # Particles of kinds (bool by id) at cells (worlds, xs, ys) swap with the cell dx, dy away if it
+    # is empty or lighter. 4 phases by (x % 2, y % 2), so two movers never go for the same cell.
+    # Like sim.fall_sand, once a particle went diagonally or sideways the rest of its tries still go
+    # from the cell it left, with its density (whatever is there now gets swapped along). behind has
+    # the id of the particle that left each cell, move_pass clears it.
+    w, x, y = cells
+    tx, ty = x + dx, y + dy
+    inside = (tx >= 0) & (tx < ids.shape[1]) & (ty >= 0) & (ty < ids.shape[2])
+    w, x, y, tx, ty = w[inside], x[inside], y[inside], tx[inside], ty[inside]
+    pushing = kinds[behind[w, x, y]]
+    real = kinds[ids[w, x, y]] & ~pushing
+    at = real | pushing
+    w, x, y, tx, ty, real = w[at], x[at], y[at], tx[at], ty[at], real[at]
+    phase = (x & 1) * 2 + (y & 1)
+    for p in range(4):
+        at = phase == p
+        pw, px, py, ptx, pty, preal = w[at], x[at], y[at], tx[at], ty[at], real[at]
+        # Done if it moved already (or something moved in)
+        preal &= ~moved[pw, px, py]
+        mover = np.where(preal, ids[pw, px, py], behind[pw, px, py])
+        other = ids[pw, ptx, pty]
+        ok = (preal | ~real[at]) & ((other == 0) | (density[pw, other] < density[pw, mover]))
+        pw, px, py, ptx, pty, preal, mover = pw[ok], px[ok], py[ok], ptx[ok], pty[ok], preal[ok], mover[ok]
+        for plane in (ids, lives, ctypes, moved):
+            going = plane[pw, px, py]
+            plane[pw, px, py] = plane[pw, ptx, pty]
+            plane[pw, ptx, pty] = going
+        pw, px, py, ptx, pty = pw[preal], px[preal], py[preal], ptx[preal], pty[preal]
+        moved[pw, ptx, pty] = True
+        arrived[pw, ptx, pty] = True
+        vacated[pw, px, py] = True
+        if dx:
+            behind[pw, px, py] = mover[preal]
+
+def move_pass():
+    # Like the falling logic in sim.fall_sand: straight first, then the diagonals (and sideways for
+    # liquids) in a random order per particle. The particles go in MOVE_GROUPS groups by the tick's
+    # order, so one that's blocked doesn't always get to try its diagonals after all its neighbours
+    # moved (in sim.fall_sand it does only if its go comes later).
+    group = (order * MOVE_GROUPS).astype(np.int8)
+    movable = pours | rises | drifts
+    for g in range(MOVE_GROUPS):
+        # Everything that moves from here on starts at one of these cells (or is swapped into one)
+        w, x, y = np.nonzero((group == g) & movable[ids] & ~moved)
+        if not len(w):
+            continue
+        right_first = rng.random(len(w)) < 0.5
+        left_first = ~right_first
+        for kinds, dy in ((pours, 1), (rises, -1)):
+            move(kinds, (w, x, y), 0, dy)
+            move(kinds, pick((w, x, y), right_first), 1, dy)
+            move(kinds, pick((w, x, y), left_first), -1, dy)
+            move(kinds, pick((w, x, y), left_first), 1, dy)
+            move(kinds, pick((w, x, y), right_first), -1, dy)
+        right_first = rng.random(len(w)) < 0.5
+        left_first = ~right_first
+        move(flows, pick((w, x, y), right_first), 1, 0)
+        move(flows, pick((w, x, y), left_first), -1, 0)
+        move(flows, pick((w, x, y), left_first), 1, 0)
+        move(flows, pick((w, x, y), right_first), -1, 0)
+        # Gas: every particle tries one random neighbour
+        if drifts.any():
+            behind[w, x, y] = 0
+            direction = rng.integers(len(sim.NEIGHBOURS), size=len(w))
+            for k, (dx, dy) in enumerate(sim.NEIGHBOURS):
+                move(drifts, pick((w, x, y), direction == k), dx, dy)
+        behind[w, x, y] = 0
+
+def heat_pass():
+    # heat.step for every world at once
+    t = temperature
+    padded = np.pad(t, ((0, 0), (1, 1), (1, 1)), mode='edge')
+    around = (padded[:, :-2, 1:-1] + padded[:, 2:, 1:-1] + padded[:, 1:-1, :-2] + padded[:, 1:-1, 2:]) * 0.25
+    t += conductivity[ids] * (around - t)
+    t += (heat.AMBIENT - t) * heat.COOLING
+    for element, threshold, becomes, chance, rule in heat.phase_rules:
+        changes = (ids == element) & (t >= threshold)
+        if chance < 1:
+            changes &= rng.random(ids.shape) < chance
+        if changes.any():
+            become(np.nonzero(changes), becomes)
+    held = emits[ids]
+    sources = ~np.isnan(held)
+    t[sources] = held[sources]
+
+def step():
+    global tick, order
+    moved[:] = ids == 0  # Empty cells (and whatever gets made in them this tick) get no go
+    order = rng.random(ids.shape)  # Where each cell's go comes in the tick, like sim's shuffled order
+    arrived[:] = False
+    vacated[:] = False
+    life_pass()
+    reaction_pass()
+    cooldown_pass()
+    electricity_pass()
+    burn_pass()
+    plant_pass()
+    acid_pass()
+    clone_pass()
+    move_pass()
+    reaction_pass(late=True)
+    clone_pass(late=True)
+    heat_pass()
+    tick += 1
+
+def populations():
+    # [world, id] -> count
+    n = len(sim.element_names)
+    return np.bincount((ids.astype(np.int64) + world * n).ravel(), minlength=len(ids) * n).reshape(len(ids), n)
+
+def population_dicts():
+    return [dict(zip(sim.element_names[1:], row[1:].tolist())) for row in populations()]
+
+def run_batch(scenario, seed=0):
+    # Like batch.run_batch, but all the runs stepped together in this process (no achievements,
+    # and "seed" is the placement seed, see the top)
+    metrics = scenario.get("metrics", [metric for metric in batch.METRICS if metric != "achievements"])
+    if "achievements" in metrics:
+        raise ValueError("multiworld doesn't track achievements, take it out of the scenario's metrics or run without --multi")
+    jobs = batch.make_jobs(scenario)
+    setup(scenario, jobs, seed)
+    steps = scenario.get("steps", 1000)
+    sample_every = scenario.get("sample_every", 100)
+    series = [[] for _ in jobs]
+    track_populations = "populations" in metrics
+
+    def sample():
+        for k, counts in enumerate(population_dicts()):
+            series[k].append((tick, counts))
+
+    if track_populations:
+        sample()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+        if track_populations and tick % sample_every == 0:
+            sample()
+    seconds = time.perf_counter() - start
+
+    results = []
+    for k, (run, world_seed, params) in enumerate(jobs):
+        result = {"run": run, "seed": world_seed, "params": params, "steps": steps}
+        if "speed" in metrics:
+            result["seconds"] = seconds / len(jobs)  # Share of the time
+            result["steps_per_sec"] = steps * len(jobs) / seconds if seconds else float("inf")
+        if "exploded" in metrics:
+            result["exploded"] = {name: n for name, n in exploded[k].items() if n}
+            result["exploded_total"] = sum(exploded[k].values())
+        if track_populations:
+            result["populations"] = series[k][-1][1]
+            result["series"] = series[k]
+        results.append(result)
+    return results
+
+def compare(scenario, steps=None):
+    # Population curves, mean over the runs of each parameter set: this engine vs batch.py's.
+    # Returns (table of final populations, problems). A difference is a problem if it is past equiv.py's
+    # tolerances and past NOISE standard errors (one run that burns down all the wood moves a mean a lot).
+    scenario = dict(scenario, metrics=["populations"])
+    if steps:
+        scenario["steps"] = steps
+    multi = run_batch(scenario)
+    single = batch.run_batch(scenario)
+    groups = {}
+    for a, b in zip(multi, single):
+        groups.setdefault(json.dumps(a["params"], sort_keys=True), []).append((a["series"], b["series"]))
+    lines = [f"{'params':24} {'element':12} {'multiworld':>10} {'sim':>10}"]
+    problems = []
+    for params, runs in groups.items():
+        for element in data:
+            for k, (tick_at, _) in enumerate(runs[0][0]):
+                a = np.array([m[k][1][element] for m, _ in runs], dtype=float)
+                b = np.array([s[k][1][element] for _, s in runs], dtype=float)
+                error = np.sqrt((a.var(ddof=1) + b.var(ddof=1)) / len(runs)) if len(runs) > 1 else 0.0
+                if equiv.diverged(b.mean(), a.mean()) and abs(a.mean() - b.mean()) > NOISE * error:
+                    problems.append(f"{params} {element} at tick {tick_at}: {a.mean():.1f} vs {b.mean():.1f}")
+                    break
+            a = equiv.mean([m[-1][1][element] for m, _ in runs])
+            b = equiv.mean([s[-1][1][element] for _, s in runs])
+            if a or b:
+                lines.append(f"{params:24} {element:12} {a:10.1f} {b:10.1f}")
+    return "\n".join(lines), problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare population curves of batch.py --multi with the normal engine.")
+    parser.add_argument("scenario", help="Scenario JSON file (see batch.py)")
+    parser.add_argument("--steps", type=int, help="Ticks per run (default: the scenario's)")
+    args = parser.parse_args()
+    table, problems = compare(batch.load_scenario(args.scenario), args.steps)
+    print(table)
+    for problem in problems:
+        print(f"diverged: {problem}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,177 @@
+import argparse
+import os
+import random
+
+import numpy as np
+
+import sim  # World + simulation rules
+
+# Editing whole areas at once: fill / replace rectangles and polygons, copy / cut / paste,
+# and prefab stamps (saved clips) in STAMP_FOLDER
+#
+# An area is (x, y, mask): the top left cell and a bool array (width, height) of which cells from
+# there are in it, already clipped to the world. A clip is a copied area: its cells (element and
+# life, packed like sim.cells), its mask, and the electricity ctypes in it.
+# Every write goes through write(), which keeps counts, placed and ctype right like draw_with_brush does.
+
+STAMP_FOLDER = "prefabs"
+
+def grid():
+    return np.frombuffer(sim.cells, dtype=np.uint16).reshape(sim.W, sim.H)
+
+def clip_area(x, y, mask):
+    # Cut off whatever is outside the world
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(sim.W, x + mask.shape[0]), min(sim.H, y + mask.shape[1])
+    if x1 <= x0 or y1 <= y0:
+        return x0, y0, np.zeros((0, 0), dtype=bool)
+    return x0, y0, mask[x0 - x:x1 - x, y0 - y:y1 - y]
+
+def rect(x, y, w, h):
+    return clip_area(x, y, np.ones((max(0, w), max(0, h)), dtype=bool))
+
+def polygon(points):
+    # Cells whose centre is inside the polygon [(x, y), ...] (even-odd rule)
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    x0, y0 = int(min(xs)), int(min(ys))
+    cx, cy = np.meshgrid(np.arange(x0, int(max(xs)) + 1) + 0.5, np.arange(y0, int(max(ys)) + 1) + 0.5, indexing='ij')
+    inside = np.zeros(cx.shape, dtype=bool)
+    for (ax, ay), (bx, by) in zip(points, points[1:] + points[:1]):
+        if ay == by:
+            continue
+        crosses = (ay > cy) != (by > cy)
+        at_x = ax + (cy - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (cx < at_x)
+    return clip_area(x0, y0, inside)
+
+def new_lives(element, n):
+    # Starting life for n new particles of element (an id), like initialize_particle_life
+    p = sim.props[element]
+    if 'slife' not in p:
+        return np.zeros(n, dtype=np.uint16)
+    if isinstance(p['slife'], tuple):
+        low, high = p['slife']
+        lives = np.random.default_rng(random.getrandbits(64)).integers(low, high + 1, size=n)
+    else:
+        lives = np.full(n, p['slife'])
+    return np.minimum(lives, sim.MAX_LIFE).astype(np.uint16)
+
+def write(area, new, ctypes=None):
+    # Put the packed cells `new` (one per True in the mask) into the area. ctypes: {area-relative (x, y): id}.
+    # Returns how many cells changed element.
+    x, y, mask = area
+    if not mask.size:
+        return 0
+    view = grid()[x:x + mask.shape[0], y:y + mask.shape[1]]
+    old_ids = view[mask] & sim.ID_MASK
+    new_ids = new & sim.ID_MASK
+    changed = old_ids != new_ids
+
+    # Counts and placed (placing over the same element doesn't count, like draw_with_brush)
+    n = len(sim.element_names)
+    removed = np.bincount(old_ids[changed], minlength=n)
+    added = np.bincount(new_ids[changed], minlength=n)
+    for element in np.flatnonzero(removed | added).tolist():
+        sim.counts[element] += int(added[element]) - int(removed[element])
+        if element and added[element]:
+            sim.placed[sim.element_names[element]] += int(added[element])
+
+    # Changed cells lose their ctype
+    if sim.ctype:
+        changed_here = np.zeros(mask.shape, dtype=bool)
+        changed_here[mask] = changed
+        for i in list(sim.ctype):
+            cx, cy = divmod(i, sim.H)
+            if 0 <= cx - x < mask.shape[0] and 0 <= cy - y < mask.shape[1] and changed_here[cx - x, cy - y]:
+                del sim.ctype[i]
+    view[mask] = new
+    sim.mark_columns(x, x + mask.shape[0])
+    for (cx, cy), element in (ctypes or {}).items():
+        sim.ctype[(x + cx) * sim.H + y + cy] = element
+    return int(changed.sum())
+
+def fill(area, element):
+    # Fill with element (a name, None = erase), new particles get a fresh life
+    x, y, mask = area
+    new_id = sim.element_ids[element] if element else 0
+    count = int(mask.sum())
+    new = (new_lives(new_id, count) << sim.LIFE_SHIFT) | new_id if new_id else np.zeros(count, dtype=np.uint16)
+    ctypes = None
+    if new_id == sim.ELECTRICITY:
+        # Electricity on a conductor remembers what it was, like draw_with_brush
+        old = grid()[x:x + mask.shape[0], y:y + mask.shape[1]] & sim.ID_MASK
+        conductor = mask & np.isin(old, list(sim.conducts))
+        ctypes = {(cx, cy): int(old[cx, cy]) for cx, cy in zip(*np.nonzero(conductor))}
+    return write(area, new.astype(np.uint16), ctypes)
+
+def replace(area, old_element, element):
+    # Only the cells of old_element (a name, None = empty) in the area
+    x, y, mask = area
+    old_id = sim.element_ids[old_element] if old_element else 0
+    view = grid()[x:x + mask.shape[0], y:y + mask.shape[1]]
+    return fill((x, y, mask & ((view & sim.ID_MASK) == old_id)), element)
+
+def copy(area):
+    x, y, mask = area
+    cells = grid()[x:x + mask.shape[0], y:y + mask.shape[1]].copy()
+    cells[~mask] = 0
+    ctypes = {}
+    for i, element in sim.ctype.items():
+        cx, cy = divmod(i, sim.H)
+        if 0 <= cx - x < mask.shape[0] and 0 <= cy - y < mask.shape[1] and mask[cx - x, cy - y]:
+            ctypes[(cx - x, cy - y)] = element
+    return {"cells": cells, "mask": mask.copy(), "ctype": ctypes}
+
+def cut(area):
+    clip = copy(area)
+    fill(area, None)
+    return clip
+
+def paste(clip, x, y, transparent=True):
+    # Clip's top left at x, y. transparent: the clip's empty cells leave the world alone.
+    mask = clip["mask"] & ((clip["cells"] & sim.ID_MASK) != 0) if transparent else clip["mask"]
+    area = clip_area(x, y, mask)
+    ax, ay, clipped = area
+    cells = clip["cells"][ax - x:ax - x + clipped.shape[0], ay - y:ay - y + clipped.shape[1]]
+    ctypes = {(cx - (ax - x), cy - (ay - y)): element for (cx, cy), element in clip["ctype"].items()
+              if 0 <= cx - (ax - x) < clipped.shape[0] and 0 <= cy - (ay - y) < clipped.shape[1] and clipped[cx - (ax - x), cy - (ay - y)]}
+    return write(area, cells[clipped], ctypes)
+
+def stamp_path(name):
+    return os.path.join(STAMP_FOLDER, name + ".npz")
+
+def save_stamp(clip, name):
+    # Element names go along, so a stamp still works after elements get added
+    os.makedirs(STAMP_FOLDER, exist_ok=True)
+    ctypes = np.array([[cx, cy, element] for (cx, cy), element in clip["ctype"].items()], dtype=np.int64).reshape(-1, 3)
+    np.savez_compressed(stamp_path(name), cells=clip["cells"], mask=clip["mask"], ctype=ctypes,
+                        elements=np.array([name or "" for name in sim.element_names]))
+
+def load_stamp(name):
+    with np.load(stamp_path(name)) as f:
+        cells, mask, ctypes, elements = f["cells"], f["mask"], f["ctype"], f["elements"].tolist()
+    # Ids of the stamp's elements -> ids now
+    remap = np.zeros(256, dtype=np.uint16)
+    for old_id, element in enumerate(elements[1:], 1):
+        if element not in sim.element_ids:
+            raise ValueError(f"Stamp {name} uses {element}, which doesn't exist")
+        remap[old_id] = sim.element_ids[element]
+    cells = (cells & sim.LIFE_MASK) | remap[cells & sim.ID_MASK]
+    return {"cells": cells, "mask": mask, "ctype": {(int(cx), int(cy)): int(remap[e]) for cx, cy, e in ctypes}}
+
+def stamps():
+    if not os.path.isdir(STAMP_FOLDER):
+        return []
+    return sorted(name[:-4] for name in os.listdir(STAMP_FOLDER) if name.endswith(".npz"))
+
+def stamp(name, x, y):
+    return paste(load_stamp(name), x, y)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefab stamps.")
+    parser.add_argument("command", choices=["list"])
+    args = parser.parse_args()
+    for name in stamps():
+        clip = load_stamp(name)
+        print(f"{name}  {clip['cells'].shape[0]}x{clip['cells'].shape[1]}")
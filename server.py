@@ -0,0 +1,264 @@
+import argparse
+import select
+import selectors
+import socket
+import struct
+import time
+import zlib
+from array import array
+
+import numpy as np
+
+import sim  # World + simulation rules
+import worldshare  # Live world for other programs
+
+# Headless server: steps the world and streams it to viewers (see viewer.py)
+#
+# Wire format, every message is:
+#   <I length of the rest> <B kind> <I tick> <zlib data>
+# kind KEYFRAME: data = <HH width height> + sim.cells as is (one <H> per cell, x-major)
+# kind DELTA:    data = for each tick in the batch: <II tick count> + count * <IH cell index, cell>
+# A cell is packed like in sim.py: element id (sim.element_ids, 0 = empty) in the low byte, life in the high byte.
+
+KEYFRAME = 0
+DELTA = 1
+MESSAGE_HEADER = struct.Struct("<IBI")
+KEYFRAME_HEADER = struct.Struct("<HH")
+DELTA_TICK = struct.Struct("<II")
+DELTA_CELL = struct.Struct("<IH")
+
+DEFAULT_PORT = 5050
+TICKS_PER_SECOND = 60  # Same as the game FPS
+BATCH_TICKS = 4  # Deltas of this many ticks go out in one message
+KEYFRAME_EVERY = 600  # Resend a full frame this often (ticks) so viewers can't drift
+MAX_BACKLOG = 1 << 20  # Bytes queued for a client before it is skipped to the next keyframe
+DRAIN_TIMEOUT = 5  # Seconds viewers get to take the rest of the stream at the end (max_ticks)
+DELTA_CELLS = np.dtype([("index", "<u4"), ("cell", "<u2")])  # Same bytes as DELTA_CELL
+
+def snapshot():
+    # Copy of the world, already in the wire's cell format
+    return np.frombuffer(sim.cells, dtype=np.uint16).copy()
+
+def make_message(kind, tick, payload):
+    data = zlib.compress(payload)
+    return MESSAGE_HEADER.pack(MESSAGE_HEADER.size - 4 + len(data), kind, tick) + data
+
+def make_keyframe(tick, cells):
+    payload = KEYFRAME_HEADER.pack(sim.W, sim.H) + cells.tobytes()
+    return make_message(KEYFRAME, tick, payload)
+
+def make_delta(batch):
+    # batch = [(tick, changes from diff()), ...]
+    parts = []
+    for tick, changes in batch:
+        parts.append(DELTA_TICK.pack(tick, len(changes)))
+        parts.append(changes.tobytes())
+    return make_message(DELTA, batch[-1][0], b"".join(parts))
+
+def diff(old, new):
+    # Changed cells as a DELTA_CELLS array
+    changed = np.flatnonzero(old != new)
+    changes = np.empty(len(changed), dtype=DELTA_CELLS)
+    changes["index"] = changed
+    changes["cell"] = new[changed]
+    return changes
+
+def read_messages(buffer):
+    # Split complete messages off the front of a bytearray, leaves the rest in it
+    messages = []
+    while len(buffer) >= MESSAGE_HEADER.size:
+        length, kind, tick = MESSAGE_HEADER.unpack_from(buffer)
+        end = 4 + length
+        if len(buffer) < end:
+            break
+        messages.append((kind, tick, zlib.decompress(bytes(buffer[MESSAGE_HEADER.size:end]))))
+        del buffer[:end]
+    return messages
+
+def apply_message(cells, kind, payload):
+    # Apply a decoded message to a viewer's copy of the world, returns the (maybe new) cells
+    if kind == KEYFRAME:
+        width, height = KEYFRAME_HEADER.unpack_from(payload)
+        cells = array('H')
+        cells.frombytes(payload[KEYFRAME_HEADER.size:])
+        return cells, (width, height)
+    offset = 0
+    while offset < len(payload):
+        tick, count = DELTA_TICK.unpack_from(payload, offset)
+        offset += DELTA_TICK.size
+        for index, cell in DELTA_CELL.iter_unpack(payload[offset:offset + count * DELTA_CELL.size]):
+            cells[index] = cell
+        offset += count * DELTA_CELL.size
+    return cells, None
+
+class Client:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.queue = []  # Messages waiting to be sent
+        self.sent = 0  # How much of queue[0] already went out
+        self.queued_bytes = 0
+        self.needs_keyframe = True  # New clients start with a keyframe
+
+    def push(self, message, keyframe=False):
+        if keyframe:
+            # A keyframe makes everything not sent yet useless
+            self.drop_unsent()
+        elif self.queued_bytes > MAX_BACKLOG:
+            # Too slow: throw away the backlog and resync with the next keyframe
+            self.drop_unsent()
+            self.needs_keyframe = True
+            return
+        self.queue.append(message)
+        self.queued_bytes += len(message)
+
+    def drop_unsent(self):
+        # Keep only a half sent message, so the stream stays readable
+        self.queue = self.queue[:1] if self.sent else []
+        self.queued_bytes = sum(len(m) for m in self.queue)
+
+    def flush(self):
+        # Send as much as the socket takes without blocking, False if the client went away
+        while self.queue:
+            message = self.queue[0]
+            try:
+                n = self.sock.send(message[self.sent:])
+            except BlockingIOError:
+                return True
+            except OSError:
+                return False
+            self.sent += n
+            if self.sent < len(message):
+                return True
+            self.queue.pop(0)
+            self.queued_bytes -= len(message)
+            self.sent = 0
+        return True
+
+def serve(host, port, ticks_per_second=TICKS_PER_SECOND, batch_ticks=BATCH_TICKS, keyframe_every=KEYFRAME_EVERY, max_ticks=None):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen()
+    listener.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    print(f"Serving {sim.W}x{sim.H} world on {host}:{port}")
+
+    clients = []
+    previous = None  # Last tick's cells, only kept while someone is watching
+    batch = []
+    tick_time = 1 / ticks_per_second if ticks_per_second else 0
+    next_tick = time.perf_counter()
+    try:
+        while max_ticks is None or sim.tick < max_ticks:
+            # Accept new viewers and notice closed ones while waiting for the next tick
+            timeout = max(0, next_tick - time.perf_counter())
+            for key, _ in selector.select(timeout):
+                if key.fileobj is listener:
+                    sock, address = listener.accept()
+                    sock.setblocking(False)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    client = Client(sock, address)
+                    clients.append(client)
+                    selector.register(sock, selectors.EVENT_READ, client)
+                    print(f"Viewer connected: {address}")
+                else:
+                    client = key.data
+                    try:
+                        alive = key.fileobj.recv(4096)  # Viewers don't talk, this is just for EOF
+                    except OSError:
+                        alive = b""
+                    if not alive:
+                        selector.unregister(client.sock)
+                        client.sock.close()
+                        clients.remove(client)
+                        print(f"Viewer left: {client.address}")
+            if time.perf_counter() < next_tick:
+                continue
+            next_tick += tick_time
+
+            sim.step()
+            worldshare.publish()
+            if not clients:
+                # Nobody to send to, newcomers start with a keyframe anyway
+                previous = None
+                batch = []
+                continue
+            cells = snapshot()
+            if previous is None:
+                for client in clients:
+                    client.needs_keyframe = True
+            else:
+                batch.append((sim.tick, diff(previous, cells)))
+            previous = cells
+
+            last = max_ticks is not None and sim.tick >= max_ticks  # Send what's left of the batch
+            if len(batch) >= batch_ticks or sim.tick % keyframe_every == 0 or last:
+                delta = None
+                keyframe = None
+                for client in clients:
+                    if client.needs_keyframe or sim.tick % keyframe_every == 0:
+                        if keyframe is None:
+                            keyframe = make_keyframe(sim.tick, cells)
+                        client.needs_keyframe = False
+                        client.push(keyframe, keyframe=True)
+                    else:
+                        if delta is None:
+                            delta = make_delta(batch)
+                        client.push(delta)
+                batch = []
+            for client in list(clients):
+                if not client.flush():
+                    selector.unregister(client.sock)
+                    client.sock.close()
+                    clients.remove(client)
+                    print(f"Viewer dropped: {client.address}")
+        # Done (max_ticks): give the viewers a while to get everything before closing,
+        # one that stopped reading doesn't get to hold us up
+        deadline = time.perf_counter() + DRAIN_TIMEOUT
+        waiting = [client for client in clients if client.queue]
+        while waiting:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            _, ready, _ = select.select([], [client.sock for client in waiting], [], timeout)
+            for client in [client for client in waiting if client.sock in ready]:
+                if not client.flush() or not client.queue:
+                    waiting.remove(client)
+    finally:
+        for client in clients:
+            client.sock.close()
+        listener.close()
+        selector.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the sand world headless and stream it to viewers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--width", type=int, default=160, help="World width in cells")
+    parser.add_argument("--height", type=int, default=88, help="World height in cells")
+    parser.add_argument("--tps", type=float, default=TICKS_PER_SECOND, help="Ticks per second (0 = as fast as possible)")
+    parser.add_argument("--batch", type=int, default=BATCH_TICKS, help="Ticks per delta message")
+    parser.add_argument("--keyframe-every", type=int, default=KEYFRAME_EVERY, help="Ticks between forced keyframes")
+    parser.add_argument("--scenario", help="Start from a batch.py scenario file (its size wins over --width/--height)")
+    parser.add_argument("--export", help="Publish the live world to this file for other programs (see worldshare.py)")
+    parser.add_argument("--trace", help="Record reactions and write them to this file on exit (see tracelog.py)")
+    args = parser.parse_args()
+
+    if args.scenario:
+        import batch
+        batch.setup(batch.load_scenario(args.scenario))
+    else:
+        sim.reset(args.width, args.height)
+    if args.trace:
+        import tracelog
+        tracelog.enable()
+    if args.export:
+        worldshare.start(args.export)
+    try:
+        serve(args.host, args.port, args.tps, args.batch, args.keyframe_every)
+    except KeyboardInterrupt:
+        pass
+    if args.trace:
+        tracelog.dump(args.trace)
@@ -0,0 +1,781 @@
+from data import data, achievements, reactions  # Element definitions, achievements and reactions
+import random  # For random order logic
+from array import array  # Packed world storage
+from collections import deque
+import numpy as np  # Bulk update orders
+import heat  # Temperature field (melting, boiling, ignition)
+import tracelog  # Reaction trace (off unless tracing)
+
+# This file holds the world and the simulation rules, so it can run without a window
+# (powdergame.py is the window, server.py streams it headless)
+
+# help bro out
+for thing, value in data.items():
+    if value["fall"] == 0: # Solid materials
+        # Prevent weirdness
+        value["density"] = 1e9 # BIG
+
+# Element ids (0 = empty)
+element_names = [None] + list(data.keys())
+element_ids = {name: i for i, name in enumerate(element_names)}
+props = [None] + [data[name] for name in element_names[1:]]  # props[id] is the element's data dict
+
+# Ids the rules check for by name
+WATER = element_ids["water"]
+LAVA = element_ids["lava"]
+ELECTRICITY = element_ids["electricity"]
+FIRE = element_ids["fire"]
+PLANT = element_ids["plant"]
+
+# A cell is one 16 bit number: element id in the low byte, life in the high byte
+ID_MASK = 0xFF
+LIFE_SHIFT = 8
+LIFE_MASK = 0xFF00
+MAX_LIFE = 255
+
+# Counters
+achievement_counts = {}   # Track counts for achievement conditions
+placed = {}
+for key in data:
+    placed[key] = 0  # Initialize placed counts for each particle type
+exploded = {}
+for key in data:
+    exploded[key] = 0  # Initialize exploded counts for each particle type
+
+def reset_counters():
+    # Forget placed/exploded/achievement progress (a fresh run, not just a cleared board)
+    achievement_counts.clear()
+    for key in data:
+        placed[key] = 0
+        exploded[key] = 0
+    for achievement in achievements.values():
+        achievement['achieved'] = False
+
+# Element rules turned into id lookups, rebuilt by compile_elements() (reset() calls it, so data overrides apply)
+reaction_table = []  # [id * number of ids + neighbour id] -> (id it becomes, neighbour becomes, chance) or None
+reacts = []  # id -> True if it is the first element of any reaction
+conducts = set()  # ids electricity runs through
+exclude_corrode = []  # id -> ids it can't corrode
+shatter_into = []  # id -> id or 0
+clone_into = []  # id -> id or 0
+burn_into = []  # id -> overrideburn id or 0
+my_burn_into = []  # id -> overridemyburn id or 0
+life0 = []  # id -> None, ("die", 0) or ("become", id)
+no_explode_fire = set()  # ids an explosion won't set on fire
+
+def compile_elements():
+    global reaction_table, reacts, conducts, exclude_corrode, shatter_into, clone_into, burn_into, my_burn_into, life0, no_explode_fire
+    ids = element_ids
+    exclude_corrode = [set()]
+    shatter_into = [0]
+    clone_into = [0]
+    burn_into = [0]
+    my_burn_into = [0]
+    life0 = [None]
+    for name in element_names[1:]:
+        d = data[name]
+        exclude_corrode.append({ids[t] for t in d.get('excludecorrode', []) if t in ids})
+        shatter_into.append(ids[d['shatter']] if d.get('shatter') else 0)
+        clone_into.append(ids[d['clone']] if d.get('clone', False) else 0)
+        burn_into.append(ids[d['overrideburn']] if d.get('overrideburn', False) else 0)
+        my_burn_into.append(ids[d['overridemyburn']] if d.get('overridemyburn', False) else 0)
+        if 'slife' in d:
+            effect = d['life0'][0]
+            life0.append((effect, ids[d['life0'][1].lower()] if effect == "become" else 0))
+        else:
+            life0.append(None)
+    conducts = {ids[t] for t in data["electricity"]["conducts"]}
+
+    # Reactions: a dense table of every (element, neighbour) pair
+    n = len(element_names)
+    reaction_table = [None] * (n * n)
+    pairs = []
+    for name in element_names[1:]:
+        if data[name].get('transmuteonpresence', False):
+            things, becomes = data[name]['transmuteonpresence']
+            if not isinstance(things, list):
+                things = [things]
+            pairs += [[name, thing, becomes, thing, 1] for thing in things]
+    for element, neighbour, becomes, other_becomes, chance in pairs + reactions:
+        if element not in ids or neighbour not in ids:
+            continue  # Reaction with an element that doesn't exist (yet)
+        reaction_table[ids[element] * n + ids[neighbour]] = (ids[becomes] if becomes else 0, ids[other_becomes] if other_becomes else 0, chance)
+    reacts = [any(reaction_table[e * n:(e + 1) * n]) for e in range(n)]
+    no_explode_fire = {ids[t] for t in ["wall", "fire", "lava", "electricity", "steam", "obsidian"]}
+
+compile_elements()
+
+# World
+W, H = 0, 0  # Size in cells
+cells = array('H')  # cells[x * H + y], see above for the packing
+ctype = {}  # Sparse: cell index -> id of what electricity was before it (moves with the particle)
+counts = [0] * len(element_names)  # counts[id] = how many cells hold that element right now (counts[0] = empty)
+population_history = None  # deque of (tick, counts tuple) per tick, see track_population_history()
+tick = 0  # Number of simulation steps done
+explosion_hook = None  # Called right before a blast changes anything (history.py uses it for undo)
+tracing = False  # Record reactions in tracelog's ring buffer (tracelog.enable() turns it on)
+update_order = "shuffle"  # How fall_sand() orders the particles each tick, see ORDERS
+evaluate_once = True  # Every particle gets exactly one go per tick (False = the old way, see fall_sand())
+state = bytearray()  # Per cell, during fall_sand(): EMPTY, PENDING or DONE (moves with the particle)
+DIRTY_COLUMNS = 32  # Width of the column bands dirty is kept in (lod.py redraws whole bands)
+dirty = set()  # Bands (cell index // band_cells) written since lod.py last took them
+band_cells = DIRTY_COLUMNS  # Cells per band, DIRTY_COLUMNS * H
+
+def reset(width, height):
+    # Make a new empty world of width x height cells
+    global W, H, cells, ctype, tick, state, band_cells
+    compile_elements()
+    heat.compile_elements()
+    heat.reset(width, height)
+    W, H = width, height
+    cells = array('H', bytes(2 * width * height))
+    state = bytearray(width * height)
+    ctype = {}
+    tick = 0
+    band_cells = DIRTY_COLUMNS * max(1, height)
+    dirty.clear()
+    mark_columns(0, width)
+    recount()
+
+def mark_columns(start, end):
+    # Columns start..end were written some other way than the functions below (numpy, undo, ...)
+    dirty.update(range(start // DIRTY_COLUMNS, (end - 1) // DIRTY_COLUMNS + 1))
+
+def mark_cells(where):
+    # Same for a numpy array of cell indexes
+    dirty.update(np.unique(where // band_cells).tolist())
+
+def get(x, y):
+    # Element name at x, y (None = empty)
+    return element_names[cells[x * H + y] & ID_MASK]
+
+def get_life(x, y):
+    return cells[x * H + y] >> LIFE_SHIFT
+
+def recount():
+    # Rebuild counts from scratch, for when cells got replaced wholesale (reset, undo)
+    fresh = [0] * len(element_names)
+    for cell in cells:
+        fresh[cell & ID_MASK] += 1
+    counts[:] = fresh
+
+def population(element):
+    # How many of one element are on the board right now
+    return counts[element_ids[element]]
+
+def populations():
+    # How many of each element are on the board right now
+    return {name: counts[i] for i, name in enumerate(element_names) if name}
+
+def track_population_history(length=600):
+    # Keep the counts of the last `length` ticks (0 turns it off)
+    global population_history
+    population_history = deque(maxlen=length) if length else None
+
+def step():
+    # One simulation tick
+    global tick
+    update_particle_life()  # Update life values before falling logic
+    fall_sand()  # Apply sand falling logic
+    heat.step()  # Spread heat, melt/boil/ignite
+    tick += 1
+    if population_history is not None:
+        population_history.append((tick, tuple(counts)))
+
+# state values
+EMPTY = 0  # Nothing there when the tick started (or made this tick), no go this tick
+PENDING = 1
+DONE = 2
+
+def swap(a, b):
+    # Swap two cells, the ctype (and the fall_sand() state) goes along
+    cells[a], cells[b] = cells[b], cells[a]
+    state[a], state[b] = state[b], state[a]
+    dirty.add(a // band_cells)
+    dirty.add(b // band_cells)
+    if ctype:
+        ca = ctype.pop(a, None)
+        cb = ctype.pop(b, None)
+        if ca:
+            ctype[b] = ca
+        if cb:
+            ctype[a] = cb
+
+def set_element(i, element):
+    # Change what is in a cell (life stays), keeps the population counts right
+    old = cells[i] & ID_MASK
+    counts[old] -= 1
+    counts[element] += 1
+    cells[i] = (cells[i] & LIFE_MASK) | element
+    dirty.add(i // band_cells)
+
+def set_life(i, life):
+    if life < 0:
+        life = 0
+    elif life > MAX_LIFE:
+        life = MAX_LIFE
+    cells[i] = (cells[i] & ID_MASK) | (life << LIFE_SHIFT)
+    dirty.add(i // band_cells)
+
+# Bresenham's Line Algorithm
+def bresenham(x1, y1, x2, y2):
+    points = []
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    err = dx - dy
+
+    while True:
+        points.append((x1, y1))
+        if x1 == x2 and y1 == y2:
+            break
+        e2 = err * 2
+        if e2 > -dy:
+            err -= dy
+            x1 += sx
+        if e2 < dx:
+            err += dx
+            y1 += sy
+    return points
+
+def initialize_particle_life(i, element):
+    # element is an id, only elements with slife get a life
+    if 'slife' in props[element]:
+        if isinstance(props[element]['slife'], tuple):
+            # Random value between the range
+            grid_life = random.randint(props[element]['slife'][0], props[element]['slife'][1])
+        else:
+            grid_life = props[element]['slife']
+        set_life(i, grid_life)
+
+def update_particle_life():
+    for i in range(len(cells)):
+        cell = cells[i]
+        element = cell & ID_MASK
+        if element and life0[element]:
+            dirty.add(i // band_cells)
+            life = (cell >> LIFE_SHIFT) - 1
+            if life <= 0:
+                # Handle life0 effect
+                effect, new_element = life0[element]
+                counts[element] -= 1
+                if effect == "die":
+                    cells[i] = 0
+                    counts[0] += 1
+                    if tracing:
+                        tracelog.record(tick, tracelog.LIFE_DIE, i, element, 0)
+                elif effect == "become":
+                    cells[i] = new_element
+                    counts[new_element] += 1
+                    if tracing:
+                        tracelog.record(tick, tracelog.LIFE_BECOME, i, element, new_element)
+                    # Initialize new life if the new element has life
+                    initialize_particle_life(i, new_element)
+                # Track achievement progress for the original element
+                name = element_names[element]
+                if name not in achievement_counts:
+                    achievement_counts[name] = 0
+                achievement_counts[name] += 1
+            else:
+                cells[i] = element | (life << LIFE_SHIFT)
+
+NEIGHBOURS = [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]
+
+def can_move_into(j, density):
+    # Empty, or something lighter
+    other = cells[j] & ID_MASK
+    return other == 0 or props[other].get('density', 1) < density
+
+# Update order
+#
+# Going top to bottom, left to right makes everything drift one way, so fall_sand() visits the
+# particles in a changing order. Only cells that hold something at the start of the tick get visited.
+#   "shuffle"    every occupied cell, random.shuffle'd (the original, the reference for equivalence)
+#   "numpy"      same idea, permuted in bulk by numpy
+#   "alternate"  bottom to top one tick and top to bottom the next, rows go left and right in turn
+#   "chunks"     CHUNK_SIZE x CHUNK_SIZE blocks in random order, each scanned with a random
+#                pattern from a cache of strided permutations
+# The numpy ones draw their seed from random, so random.seed() still makes runs repeat.
+
+ORDERS = ["shuffle", "numpy", "alternate", "chunks"]
+CHUNK_SIZE = 8
+CHUNK_STRIDES = [5, 13, 21, 29, 37, 45, 53, 61]  # Odd, so stepping by them visits every cell of a chunk
+CHUNK_OFFSETS = [0, 17, 34, 51]
+
+order_cache = {}  # (W, H, name) -> cached index arrays
+
+def shuffle_order():
+    positions = [i for i in range(len(cells)) if cells[i] & ID_MASK]
+    random.shuffle(positions)  # Shuffle positions for random order
+    return positions
+
+def occupied_in(order):
+    # The cells of order (numpy indexes) that hold something right now, as a list
+    ids = np.frombuffer(cells, dtype=np.uint16) & ID_MASK
+    return order[ids[order] != 0].tolist()
+
+def numpy_order():
+    ids = np.frombuffer(cells, dtype=np.uint16) & ID_MASK
+    rng = np.random.default_rng(random.getrandbits(64))
+    return rng.permutation(np.flatnonzero(ids)).tolist()
+
+def alternate_order():
+    # 4 scans (up/down, first row left/right), one per tick in turn
+    key = (W, H, "alternate")
+    if key not in order_cache:
+        rows = np.arange(W * H, dtype=np.int64).reshape(W, H).T.copy()  # rows[y] = indexes left to right
+        scans = []
+        for variant in range(4):
+            r = rows.copy()
+            r[variant >> 1::2] = r[variant >> 1::2, ::-1]
+            if variant & 1:
+                r = r[::-1]
+            scans.append(r.reshape(-1))
+        order_cache[key] = scans
+    return occupied_in(order_cache[key][tick % 4])
+
+def chunk_order():
+    key = (W, H, "chunks")
+    if key not in order_cache:
+        n = CHUNK_SIZE * CHUNK_SIZE
+        patterns = np.array([[(offset + stride * k) % n for k in range(n)] for stride in CHUNK_STRIDES for offset in CHUNK_OFFSETS])
+        cx, cy = np.meshgrid(np.arange(0, W, CHUNK_SIZE), np.arange(0, H, CHUNK_SIZE), indexing='ij')
+        order_cache[key] = (patterns // CHUNK_SIZE, patterns % CHUNK_SIZE, cx.reshape(-1), cy.reshape(-1))
+    dx, dy, cx, cy = order_cache[key]
+    rng = np.random.default_rng(random.getrandbits(64))
+    chunks = rng.permutation(len(cx))
+    picked = rng.integers(len(dx), size=len(cx))
+    x = cx[chunks][:, None] + dx[picked]
+    y = cy[chunks][:, None] + dy[picked]
+    inside = (x < W) & (y < H)
+    return occupied_in((x * H + y)[inside])
+
+def particle_order():
+    if update_order == "shuffle":
+        return shuffle_order()
+    if update_order == "numpy":
+        return numpy_order()
+    if update_order == "alternate":
+        return alternate_order()
+    if update_order == "chunks":
+        return chunk_order()
+    raise ValueError(f"Unknown update order: {update_order} (pick from {', '.join(ORDERS)})")
+
+def evaluation_order():
+    # Cells to visit this tick. Particles carry their state when they move, so one that moved
+    # into a cell that comes later gets skipped there. One that got pushed into a cell that was
+    # already visited is still PENDING after the pass, so it gets its go in a catch-up pass.
+    flags = np.frombuffer(state, dtype=np.uint8)
+    flags[:] = (np.frombuffer(cells, dtype=np.uint16) & ID_MASK) != 0  # PENDING where occupied
+    yield from particle_order()
+    while True:
+        left = np.flatnonzero(flags == PENDING)
+        if not len(left):
+            return
+        yield from left.tolist()
+
+# Sand falling logic
+def fall_sand():
+    # new feature: update in random order instead of top to down
+    # (with evaluate_once every particle there at the start of the tick gets exactly one go,
+    # without it a particle that moves into a cell later in the order goes again)
+    for i in (evaluation_order() if evaluate_once else particle_order()):
+        if evaluate_once:
+            if state[i] != PENDING:
+                continue
+            state[i] = DONE
+        tile = cells[i] & ID_MASK
+        if tile:
+            x, y = divmod(i, H)
+            p = props[tile]
+            # Reactions with neighbours (reactions in data.py), one lookup per neighbour
+            if reacts[tile]:
+                row = tile * len(element_names)
+                for dx, dy in NEIGHBOURS:
+                    nx, ny = x + dx, y + dy
+                    if (0 <= nx < W and 0 <= ny < H):
+                        n = nx * H + ny
+                        adjacent_tile = cells[n] & ID_MASK
+                        reaction = reaction_table[row + adjacent_tile]
+                        if reaction:
+                            becomes, other_becomes, chance = reaction
+                            if chance < 1 and random.random() >= chance:
+                                continue
+                            if becomes != tile:
+                                set_element(i, becomes)
+                                initialize_particle_life(i, becomes)
+                                if tracing:
+                                    tracelog.record(tick, tracelog.REACT, i, tile, becomes)
+                            if other_becomes != adjacent_tile:
+                                set_element(n, other_becomes)
+                                if other_becomes:
+                                    initialize_particle_life(n, other_becomes)
+                                if tracing:
+                                    tracelog.record(tick, tracelog.REACT, n, adjacent_tile, other_becomes)
+
+            # electricite behaviour
+            if tile == ELECTRICITY:
+                # Check all 8 adjacent tiles
+                for dx, dy in NEIGHBOURS:
+                    # if theyre in the grid
+                    nx, ny = x + dx, y + dy
+                    if (0 <= nx < W and 0 <= ny < H):
+                        n = nx * H + ny
+                        # if tjeure in electricity's conducts list and arent on cooldown
+                        if cells[n] & ID_MASK in conducts and cells[n] >> LIFE_SHIFT <= 0:
+                            # replace the tile with electricity, with a CTYPE of the tile
+                            ctype[n] = cells[n] & ID_MASK
+                            counts[ctype[n]] -= 1
+                            counts[ELECTRICITY] += 1
+                            # set life to 2
+                            cells[n] = ELECTRICITY | (2 << LIFE_SHIFT)
+                            dirty.add(n // band_cells)
+                            if tracing:
+                                tracelog.record(tick, tracelog.CONDUCT, n, ctype[n], ELECTRICITY)
+                # reduce life by 1
+                life = (cells[i] >> LIFE_SHIFT) - 1
+                # if life is 0, electricity goes away
+                if life <= 0:
+                    # Check if it has a ctype
+                    counts[cells[i] & ID_MASK] -= 1
+                    if ctype.get(i):
+                        # replace with the ctype, life 10 for cooldown
+                        cells[i] = ctype.pop(i) | (10 << LIFE_SHIFT)
+                    else:
+                        # remove electricity
+                        cells[i] = 0
+                    counts[cells[i] & ID_MASK] += 1
+                    dirty.add(i // band_cells)
+                    if tracing:
+                        tracelog.record(tick, tracelog.ELECTRICITY_END, i, ELECTRICITY, cells[i] & ID_MASK)
+                    continue
+                set_life(i, life)
+
+            # (Ice melting is done by the heat field, see heat.py)
+
+            # Check for flaming stuff (like fire) spreading to flammable materials
+            if p.get('flaming', False):
+                # Check all 8 adjacent tiles
+                for dx, dy in NEIGHBOURS:
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < W and 0 <= ny < H):
+                        continue
+                    n = nx * H + ny
+                    target_tile = cells[n] & ID_MASK
+                    if target_tile and props[target_tile].get('flammable', False):
+                        target = props[target_tile]
+                        # burn * burnm chance to set fire to it. (get burn from flaming, burnm from burning)
+                        if random.random() < p.get('burn', 0.01) * target.get('burnm', 0.01):
+                            # dynamite?
+                            if target.get('exploderad', False):
+                                if explosion_hook:
+                                    explosion_hook()
+                                if tracing:
+                                    tracelog.record(tick, tracelog.EXPLODE, n, target_tile, 0)
+                                radius = target['exploderad']
+                                # Create explosion in radius
+                                for ex in range(-radius, radius + 1):
+                                    for ey in range(-radius, radius + 1):
+                                        if ex*ex + ey*ey <= radius*radius:  # Circular explosion
+                                            nx2, ny2 = nx + ex, ny + ey
+                                            if 0 <= nx2 < W and 0 <= ny2 < H:
+                                                j = nx2 * H + ny2
+                                                hit = cells[j] & ID_MASK
+                                                # Check if target can shatter
+                                                if hit and shatter_into[hit]:
+                                                    # Convert to shattered form
+                                                    exploded[element_names[hit]] += 1
+                                                    shattered_type = shatter_into[hit]
+                                                    set_element(j, shattered_type)
+                                                    # Initialize life if needed
+                                                    initialize_particle_life(j, shattered_type)
+                                                    if tracing:
+                                                        tracelog.record(tick, tracelog.SHATTER, j, hit, shattered_type)
+                                                else: # if not shattered, it  has a 10% chance of flamed unless wall or other special things
+                                                    if random.random() < 0.1 and hit not in no_explode_fire:
+                                                        set_element(j, FIRE)
+                                                        initialize_particle_life(j, FIRE)
+                                                        if tracing:
+                                                            tracelog.record(tick, tracelog.EXPLODE_FIRE, j, hit, FIRE)
+                                # Remove the exploded dynamite by fire
+                                leftover = LAVA if random.random() < 0.2 else FIRE
+                                set_element(n, leftover)
+                                # initialize life for fire
+                                initialize_particle_life(n, leftover)
+                                continue ### STUUUUUUUUU
+                            else:
+                                # Check overrideburn of the target tile, not the source tile
+                                new_tile = burn_into[target_tile] or tile
+                                if my_burn_into[tile] and not burn_into[target_tile]:
+                                    # Check if the target tile has a different overrideburn
+                                    new_tile = my_burn_into[tile]
+                                # Set the new tile and initialize its life
+                                set_element(n, new_tile)
+                                # Initialize new life if the new element has life
+                                initialize_particle_life(n, new_tile)
+                                if tracing:
+                                    tracelog.record(tick, tracelog.BURN, n, target_tile, new_tile)
+            # plants grow up rarely
+            if tile == PLANT:
+                # if no water adjacent, plant grows up with a 1% chance. otherwise, it absorbs the water and grows with a 100% chance. water is not absorbed if plant blocked.
+                # check if a obstruction
+                if y > 0 and not cells[i - 1] & ID_MASK:  # Check if space above is empty
+                    # Check for water
+                    water_pos = None
+
+                    for dx, dy in [(-1,0), (1,0), (0,1)]:  # Check left, right, below for water
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < W and 0 <= ny < H and cells[nx * H + ny] & ID_MASK == WATER:
+                            water_pos = nx * H + ny
+                            break
+
+                    if water_pos is None:
+                        # No water, small chance to grow naturally
+                        if random.random() < 0.001:
+                            set_element(i - 1, PLANT)  # Grow upward (y-1 is up in this coordinate system)
+                            initialize_particle_life(i - 1, PLANT)
+                            if tracing:
+                                tracelog.record(tick, tracelog.PLANT_GROW, i - 1, 0, PLANT)
+                    else:
+                        # Water found - absorb it and grow
+                        # Remove the water
+                        set_element(water_pos, 0)
+                        # Grow upward
+                        set_element(i - 1, PLANT)
+                        initialize_particle_life(i - 1, PLANT)
+                        if tracing:
+                            tracelog.record(tick, tracelog.PLANT_DRINK, water_pos, WATER, 0)
+                            tracelog.record(tick, tracelog.PLANT_GROW, i - 1, 0, PLANT)
+                else:
+                    # anti-drowning
+                    # 5% chance of absoribng water anyway
+                    if random.random() < 0.05:
+                        for dx, dy in [(-1,0), (1,0), (0,1)]:
+                            nx, ny = x + dx, y + dy
+                            if 0 <= nx < W and 0 <= ny < H and cells[nx * H + ny] & ID_MASK == WATER:
+                                set_element(nx * H + ny, 0)
+                                # (y-1 wraps to the bottom of the same column when y is 0, same as grid[x][-1] did)
+                                up = i - 1 if y > 0 else i + H - 1
+                                set_element(up, PLANT)
+                                initialize_particle_life(up, PLANT)
+                                if tracing:
+                                    tracelog.record(tick, tracelog.PLANT_DRINK, nx * H + ny, WATER, 0)
+                                    tracelog.record(tick, tracelog.PLANT_GROW, up, 0, PLANT)
+                                break
+            # Corrosion effects by acid on other things...
+            # this code will cause corrosion effects.
+            if p.get('corrode', False):
+                # Check all 8 adjacent tiles
+                for dx, dy in NEIGHBOURS:
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < W and 0 <= ny < H):
+                        continue
+                    n = nx * H + ny
+                    target_tile = cells[n] & ID_MASK
+                    if target_tile:
+                        # Check if the target tile is not in our excludecorrode tuple
+                        if target_tile not in exclude_corrode[tile]:
+                            # Corrode the target tile
+                            if random.random() < p.get('corrodechance', 0.1):
+                                # Corrode it
+                                set_element(n, 0)
+                                if tracing:
+                                    tracelog.record(tick, tracelog.CORRODE, n, target_tile, 0)
+                                # Track achievement progress for the original element
+                                name = element_names[tile]
+                                if name not in achievement_counts:
+                                    achievement_counts[name] = 0
+                                achievement_counts[name] += 1
+                            else:
+                                # chance for acid to also disappear over time, acid isn't infinite
+                                if random.random() < 0.01:
+                                    set_element(i, 0)
+                                    if tracing:
+                                        tracelog.record(tick, tracelog.ACID_USED_UP, i, tile, 0)
+            # clone
+            if clone_into[tile]:
+                # Check all 8 adjacent tiles
+                for dx, dy in NEIGHBOURS:
+                    nx, ny = x + dx, y + dy
+                    if (0 <= nx < W and 0 <= ny < H and
+                        not cells[nx * H + ny] & ID_MASK):  # Only clone to empty spaces
+                        n = nx * H + ny
+                        # Add random chance for growth based on particle type
+                        growth_chance = 0.05  # Default 5% chance
+
+                        # Plant-specific growth logic - slower growth to simulate real plants
+                        if tile == PLANT and random.random() < growth_chance:
+                            # Plants prefer to grow upward
+                            if dy <= 0 or random.random() < 0.3:  # Bias toward growing up
+                                new_tile = clone_into[tile]
+                                set_element(n, new_tile)
+                                # Initialize new life if the new element has life
+                                initialize_particle_life(n, new_tile)
+                                if tracing:
+                                    tracelog.record(tick, tracelog.CLONE, n, tile, new_tile)
+                        # For other particles that have clone property (like flamer)
+                        elif tile != PLANT and random.random() < 0.8:  # 80% chance for non-plants
+                            new_tile = clone_into[tile]
+                            set_element(n, new_tile)
+                            # Initialize new life if the new element has life
+                            initialize_particle_life(n, new_tile)
+                            if tracing:
+                                tracelog.record(tick, tracelog.CLONE, n, tile, new_tile)
+
+            # conductive element cooldown
+            if tile in conducts:
+                # Check if the tile has a cooldown
+                if cells[i] >> LIFE_SHIFT > 0:
+                    # Reduce the cooldown (if it reaches 0 nothing happens)
+                    cells[i] -= 1 << LIFE_SHIFT
+            # Regular falling logic continues...
+            if 'fall' in p:
+                fall_type = p['fall']
+                density = p.get('density', 1)
+
+                if fall_type == 0:
+                    continue  # Solid, no movement
+
+                if fall_type == 1:  # Powder fall
+                    # Check below first
+                    if y + 1 < H and can_move_into(i + 1, density):
+                        swap(i, i + 1)
+                        continue
+
+                    # Check down-left and down-right in random order
+                    for dx, dy in random.sample([(1, 1), (-1, 1)], 2):
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < W and 0 <= ny < H and can_move_into(nx * H + ny, density):
+                            swap(i, nx * H + ny)
+                            continue
+
+                elif fall_type == 2:  # Liquid fall
+                    # Check below first
+                    if y + 1 < H and can_move_into(i + 1, density):
+                        swap(i, i + 1)
+                        continue
+
+                    # Check down-left and down-right in random order
+                    for dx, dy in random.sample([(1, 1), (-1, 1)], 2):
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < W and 0 <= ny < H and can_move_into(nx * H + ny, density):
+                            swap(i, nx * H + ny)
+                            continue
+
+                    # Check left and right in random order
+                    for dx, dy in random.sample([(-1, 0), (1, 0)], 2):
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < W and 0 <= ny < H and can_move_into(nx * H + ny, density):
+                            swap(i, nx * H + ny)
+                            continue
+
+                elif fall_type == -1:  # Up fall (fire)
+                    # Check above first
+                    if y - 1 >= 0 and can_move_into(i - 1, density):
+                        swap(i, i - 1)
+                        continue
+
+                    # Check up-left and up-right in random order
+                    for dx, dy in random.sample([(-1, -1), (1, -1)], 2):
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < W and 0 <= ny < H and can_move_into(nx * H + ny, density):
+                            swap(i, nx * H + ny)
+                            continue
+
+                elif fall_type == 3:  # Gas
+                    # Pick a random adjacent tile (3x3 box, diagonals allowed)
+                    random_neighbors = random.sample(
+                        [(dx, dy) for dx in range(-1, 2) for dy in range(-1, 2)], 8
+                    )
+                    for dx, dy in random_neighbors:
+                        nx, ny = x + dx, y + dy
+                        if 0 <= nx < W and 0 <= ny < H and can_move_into(nx * H + ny, density):
+                            swap(i, nx * H + ny)
+                            continue
+
+                else:
+                    print("Error: Unknown fall type")
+                    quit()
+
+def check_achievements(on_unlock=None):
+    # on_unlock(achievement_id) gets called for every newly unlocked achievement
+    for achievement_id, achievement in achievements.items():
+        if not achievement['achieved']:
+            if achievement['type'] in ['Achievement', 'Challenge', 'SECRET']:
+                condition = achievement['condit'][0]
+                
+                if condition == 'liferanout':
+                    # Count how many particles of the specified type have run out of life
+                    particle_type = achievement['condit'][1]
+                    required_amount = int(achievement['condit'][2])
+                    
+                    if particle_type not in achievement_counts:
+                        achievement_counts[particle_type] = 0
+                    
+                    if achievement_counts[particle_type] >= required_amount:
+                        unlock_achievement(achievement_id, on_unlock)
+                
+                elif condition == 'place':
+                    # Check for particle placement achievements
+                    particle_type = achievement['condit'][1]
+                    if len(achievement['condit']) > 2:
+                        required_amount = int(achievement['condit'][2])
+                        if particle_type == '*':
+                            # Any particle type counts
+                            if sum(list(placed.values())) >= required_amount:
+                                unlock_achievement(achievement_id, on_unlock)
+                        else:
+                            # Specific particle type
+                            if placed[particle_type] >= required_amount:
+                                unlock_achievement(achievement_id, on_unlock)
+                    else:
+                        # Check if any particle has been placed
+                        if placed[particle_type] > 0:
+                            unlock_achievement(achievement_id, on_unlock)
+                
+                elif condition == 'place1ofall':
+                    # Check if player has placed at least one of each particle type
+                    if all(placed[key] > 0 for key in data.keys()):
+                        unlock_achievement(achievement_id, on_unlock)
+                        
+                elif condition == 'exploded':
+                    # Check if any/targeted particle has been exploded at correct count
+                    particle_type = achievement['condit'][1]
+                    required_amount = int(achievement['condit'][2]) if len(achievement['condit']) > 2 else 1
+                    if particle_type == '*':
+                        count = sum(exploded.values())
+                    else:
+                        count = exploded[particle_type]
+                    if count >= required_amount:
+                        unlock_achievement(achievement_id, on_unlock)
+
+def unlock_achievement(achievement_id, on_unlock=None):
+    if not achievements[achievement_id]['achieved']:
+        achievements[achievement_id]['achieved'] = True
+        if on_unlock:
+            on_unlock(achievement_id)
+
+def draw_with_brush(grid_x, grid_y, element, brush_size):
+    global placed
+    new_id = element_ids[element] if element else 0
+    for dx in range(-brush_size + 1, brush_size):
+        for dy in range(-brush_size + 1, brush_size):
+            # Calculate distance from center to create circular brush
+            if dx*dx + dy*dy <= brush_size*brush_size:
+                new_x, new_y = grid_x + dx, grid_y + dy
+                if 0 <= new_x < W and 0 <= new_y < H:
+                    i = new_x * H + new_y
+                    old_id = cells[i] & ID_MASK
+                    set_element(i, new_id)
+                    if old_id != new_id:
+                        ctype.pop(i, None)
+                    if element:
+                        initialize_particle_life(i, new_id)
+                        # Only count if we're placing on an empty space or replacing a different element
+                        if old_id != new_id:
+                            placed[element] += 1
+                            # electricity
+                            if new_id == ELECTRICITY and old_id in conducts:
+                                # its based off metal, remember what it was (CTYPE)
+                                ctype[i] = old_id
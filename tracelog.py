@@ -0,0 +1,163 @@
+import argparse
+import json
+import struct
+from array import array
+
+import sim  # World + simulation rules
+
+# Reaction trace: what happened where, kept in a fixed size ring buffer
+#
+# enable() turns it on (sim checks sim.tracing before recording, so off costs nothing but that check).
+# Every event is two numbers in preallocated arrays:
+#   events[k] = tick << 24 | rule << 16 | source element << 8 | target element
+#   where[k]  = cell index (x * H + y)
+# dump() writes it to a file, `python tracelog.py summary FILE` tells you what was busy.
+
+RULES = [
+    "life_die",  # Ran out of life and vanished
+    "life_become",  # Ran out of life and turned into something
+    "react",  # A reaction from data.reactions (one event per side that changed)
+    "conduct",  # Electricity spreading into a conductor
+    "electricity_end",
+    "explode",  # A dynamite blast (at the dynamite)
+    "shatter",
+    "explode_fire",
+    "burn",  # Flaming thing set fire to a neighbour
+    "plant_grow",
+    "plant_drink",
+    "corrode",
+    "acid_used_up",
+    "clone",
+    "melt",
+    "boil",
+    "ignite",
+]
+# Same order as RULES
+LIFE_DIE = 0
+LIFE_BECOME = 1
+REACT = 2
+CONDUCT = 3
+ELECTRICITY_END = 4
+EXPLODE = 5
+SHATTER = 6
+EXPLODE_FIRE = 7
+BURN = 8
+PLANT_GROW = 9
+PLANT_DRINK = 10
+CORRODE = 11
+ACID_USED_UP = 12
+CLONE = 13
+MELT = 14
+BOIL = 15
+IGNITE = 16
+
+DEFAULT_SIZE = 1 << 20  # Events kept (must be a power of 2)
+MAGIC = b"SNDTRACE"
+FILE_HEADER = struct.Struct("<8sII")  # magic, version, length of the json that follows
+
+size = 0
+mask = 0
+events = array('Q')
+where = array('I')
+count = 0  # Events recorded since enable(), the newest is at (count - 1) & mask
+
+def enable(buffer_size=DEFAULT_SIZE):
+    global size, mask, events, where, count
+    if buffer_size & (buffer_size - 1):
+        raise ValueError("Trace buffer size must be a power of 2")
+    size = buffer_size
+    mask = size - 1
+    events = array('Q', bytes(8 * size))
+    where = array('I', bytes(4 * size))
+    count = 0
+    sim.tracing = True
+
+def disable():
+    sim.tracing = False
+
+def record(tick, rule, i, source, target):
+    global count
+    k = count & mask
+    events[k] = (tick << 24) | (rule << 16) | (source << 8) | target
+    where[k] = i
+    count += 1
+
+def recorded():
+    # (events, where) oldest first
+    if count <= size:
+        return events[:count], where[:count]
+    start = count & mask
+    return events[start:] + events[:start], where[start:] + where[:start]
+
+def dump(path):
+    ordered_events, ordered_where = recorded()
+    info = {
+        "width": sim.W,
+        "height": sim.H,
+        "tick": sim.tick,
+        "rules": RULES,
+        "elements": sim.element_names,
+        "total_events": count,
+        "kept_events": len(ordered_events),
+    }
+    meta = json.dumps(info).encode()
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(MAGIC, 1, len(meta)))
+        f.write(meta)
+        ordered_events.tofile(f)
+        ordered_where.tofile(f)
+
+def load(path):
+    with open(path, "rb") as f:
+        magic, version, meta_length = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        info = json.loads(f.read(meta_length))
+        loaded_events = array('Q')
+        loaded_events.fromfile(f, info["kept_events"])
+        loaded_where = array('I')
+        loaded_where.fromfile(f, info["kept_events"])
+    return info, loaded_events, loaded_where
+
+def summary(path, top=10, region=16):
+    # Text report: busiest rules, reactions, regions and ticks
+    from collections import Counter
+    info, loaded_events, loaded_where = load(path)
+    rules, elements, height = info["rules"], info["elements"], info["height"]
+    by_rule = Counter()
+    by_reaction = Counter()
+    by_region = Counter()
+    by_tick = Counter()
+    for event, i in zip(loaded_events, loaded_where):
+        rule = (event >> 16) & 0xFF
+        by_rule[rule] += 1
+        by_reaction[(rule, (event >> 8) & 0xFF, event & 0xFF)] += 1
+        x, y = divmod(i, height)
+        by_region[(rule, x // region, y // region)] += 1
+        by_tick[event >> 24] += 1
+    lines = [f"{info['kept_events']} events kept of {info['total_events']} ({info['width']}x{info['height']} world, up to tick {info['tick']})"]
+    if by_tick:
+        lines.append(f"ticks {min(by_tick)}..{max(by_tick)}, {len(loaded_events) / len(by_tick):.1f} events per tick on average")
+    lines.append("")
+    lines.append("Rules:")
+    for rule, n in by_rule.most_common(top):
+        lines.append(f"  {rules[rule]:16} {n}")
+    lines.append("Reactions (rule: source -> target):")
+    for (rule, source, target), n in by_reaction.most_common(top):
+        lines.append(f"  {rules[rule]}: {elements[source]} -> {elements[target]}  {n}")
+    lines.append(f"Regions ({region}x{region} cells):")
+    for (rule, rx, ry), n in by_region.most_common(top):
+        lines.append(f"  {rules[rule]:16} x {rx * region}..{rx * region + region - 1}, y {ry * region}..{ry * region + region - 1}  {n}")
+    lines.append("Busiest ticks:")
+    for tick, n in by_tick.most_common(top):
+        lines.append(f"  tick {tick}  {n}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look at a reaction trace.")
+    parser.add_argument("command", choices=["summary"])
+    parser.add_argument("file")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--region", type=int, default=16, help="Region size in cells")
+    args = parser.parse_args()
+    print(summary(args.file, args.top, args.region))
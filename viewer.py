@@ -0,0 +1,70 @@
+import argparse
+import socket
+
+import pygame
+from data import data
+import server  # Wire format helpers
+import sim  # For the element id table
+
+# Watches a world streamed by server.py
+
+PARTICLE_SIZE = 5
+FPS = 60
+
+parser = argparse.ArgumentParser(description="Watch a world streamed by server.py.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=server.DEFAULT_PORT)
+args = parser.parse_args()
+
+sock = socket.create_connection((args.host, args.port))
+sock.setblocking(False)
+
+# Colors by element id
+colors = [None] + [data[name]["color"] for name in sim.element_names[1:]]
+
+pygame.init()
+screen = pygame.display.set_mode((320, 240))
+pygame.display.set_caption("Sand viewer")
+clock = pygame.time.Clock()
+
+buffer = bytearray()
+cells = None
+size = None
+tick = 0
+running = True
+while running:
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+
+    # Read whatever arrived
+    try:
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                running = False  # Server went away
+                break
+            buffer += chunk
+    except BlockingIOError:
+        pass
+    for kind, tick, payload in server.read_messages(buffer):
+        if kind != server.KEYFRAME and cells is None:
+            continue  # Wait for the first keyframe
+        cells, new_size = server.apply_message(cells, kind, payload)
+        if new_size and new_size != size:
+            size = new_size
+            screen = pygame.display.set_mode((size[0] * PARTICLE_SIZE, size[1] * PARTICLE_SIZE))
+
+    screen.fill((255, 255, 255))
+    if cells is not None:
+        height = size[1]
+        for i, cell in enumerate(cells):
+            if cell & 0xFF:
+                x, y = divmod(i, height)
+                pygame.draw.rect(screen, colors[cell & 0xFF], pygame.Rect(x * PARTICLE_SIZE, y * PARTICLE_SIZE, PARTICLE_SIZE, PARTICLE_SIZE))
+    pygame.display.set_caption(f"Sand viewer - tick {tick}")
+    pygame.display.flip()
+    clock.tick(FPS)
+
+sock.close()
+pygame.quit()
@@ -0,0 +1,174 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+import sim  # World + simulation rules
+
+# Publishes the live world to a memory-mapped file, so other programs (analysis, overlays) can read it
+# whenever they like without talking to the game or slowing it down
+#
+# File layout (little endian):
+#   header         magic "SNDWORLD", version, header size, width, height, element table length,
+#                  planes offset (u32 each), then sequence and tick (u64 each, at SEQUENCE_AT and TICK_AT)
+#   element table  JSON list of element names, index = id (0 = empty)
+#   planes         at planes offset: element ids, width * height bytes (x-major, x * height + y), then lives, same size
+#
+# The sequence is a seqlock: it is odd while a frame is being written. A reader reads the sequence,
+# then the planes, then the sequence again, and only trusts what it read if both were the same even
+# number (Reader.read() does that). When the world changes size a new file replaces the old one
+# (a new inode), readers open it again. On Linux a path in /dev/shm keeps it all in memory.
+
+MAGIC = b"SNDWORLD"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIII")
+SEQUENCE_AT = HEADER.size
+TICK_AT = SEQUENCE_AT + 8
+HEADER_SIZE = TICK_AT + 8
+COUNTER = struct.Struct("<Q")
+
+path = None
+file = None
+mapped = None
+ids_plane = None
+lives_plane = None
+size = (0, 0)
+sequence = 0
+
+def layout(width, height):
+    # (element table bytes, planes offset, total size)
+    table = json.dumps(sim.element_names).encode()
+    planes_at = (HEADER_SIZE + len(table) + 63) // 64 * 64
+    return table, planes_at, planes_at + 2 * width * height
+
+def start(export_path):
+    global path
+    path = export_path
+    allocate()
+    publish()
+
+def allocate():
+    # (Re)make the file for the current world size. The new file is written under another name and then
+    # moved over the old one, so readers still mapping the old file keep a whole (stale) frame instead of
+    # the file shrinking under them, and notice the new one by its inode (Reader.replaced())
+    global file, mapped, ids_plane, lives_plane, size
+    close()
+    size = (sim.W, sim.H)
+    table, planes_at, total = layout(*size)
+    file = open(path + ".new", "w+b")
+    file.truncate(total)
+    mapped = mmap.mmap(file.fileno(), total)
+    HEADER.pack_into(mapped, 0, MAGIC, VERSION, HEADER_SIZE, sim.W, sim.H, len(table), planes_at)
+    COUNTER.pack_into(mapped, SEQUENCE_AT, sequence)
+    mapped[HEADER_SIZE:HEADER_SIZE + len(table)] = table
+    cells = sim.W * sim.H
+    ids_plane = np.frombuffer(mapped, dtype=np.uint8, count=cells, offset=planes_at)
+    lives_plane = np.frombuffer(mapped, dtype=np.uint8, count=cells, offset=planes_at + cells)
+    write_frame()  # Readers that open it straight away get the world, not zeros
+    os.replace(path + ".new", path)
+
+def publish():
+    # Copy the world in as one frame (call after each step, or whenever the world changed)
+    if path is None:
+        return
+    if size != (sim.W, sim.H):
+        allocate()
+    else:
+        write_frame()
+
+def write_frame():
+    global sequence
+    cells = np.frombuffer(sim.cells, dtype=np.uint16)
+    sequence += 1  # Odd: writing
+    COUNTER.pack_into(mapped, SEQUENCE_AT, sequence)
+    np.copyto(ids_plane, cells & sim.ID_MASK, casting='unsafe')
+    np.copyto(lives_plane, cells >> sim.LIFE_SHIFT, casting='unsafe')
+    COUNTER.pack_into(mapped, TICK_AT, sim.tick)
+    sequence += 1  # Even: done
+    COUNTER.pack_into(mapped, SEQUENCE_AT, sequence)
+
+def close():
+    global file, mapped, ids_plane, lives_plane
+    ids_plane = lives_plane = None  # Views have to go before the map can close
+    if mapped is not None:
+        mapped.close()
+        file.close()
+    file = mapped = None
+
+def stop():
+    global path
+    close()
+    path = None
+
+class Reader:
+    # The other side: maps the file read only and hands out consistent frames
+
+    def __init__(self, export_path):
+        self.path = export_path
+        self.file = None
+        self.mapped = None
+        self.open()
+
+    def open(self):
+        self.close()
+        self.file = open(self.path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size, self.width, self.height, table_length, planes_at = HEADER.unpack_from(self.mapped, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a world export")
+        self.elements = json.loads(self.mapped[header_size:header_size + table_length])
+        cells = self.width * self.height
+        self.ids = np.frombuffer(self.mapped, dtype=np.uint8, count=cells, offset=planes_at).reshape(self.width, self.height)
+        self.lives = np.frombuffer(self.mapped, dtype=np.uint8, count=cells, offset=planes_at + cells).reshape(self.width, self.height)
+
+    def close(self):
+        self.ids = self.lives = None
+        if self.mapped is not None:
+            self.mapped.close()
+            self.file.close()
+        self.file = self.mapped = None
+
+    def replaced(self):
+        # The writer moves a new file in when the world changes size (even to the same number of cells),
+        # width and height get read again from its header
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return False
+
+    def read(self, look):
+        # look(tick, ids, lives) gets views straight into the map (no copies). It is called again until it
+        # saw a whole frame, so it should only read. Returns what look returned.
+        while True:
+            if self.replaced():
+                self.open()
+            before = COUNTER.unpack_from(self.mapped, SEQUENCE_AT)[0]
+            if before & 1:
+                time.sleep(0)  # Mid write
+                continue
+            tick = COUNTER.unpack_from(self.mapped, TICK_AT)[0]
+            result = look(tick, self.ids, self.lives)
+            if COUNTER.unpack_from(self.mapped, SEQUENCE_AT)[0] == before:
+                return result
+
+    def snapshot(self):
+        # (tick, ids, lives) as copies
+        return self.read(lambda tick, ids, lives: (tick, ids.copy(), lives.copy()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a world exported with --export.")
+    parser.add_argument("path")
+    parser.add_argument("--every", type=float, default=1.0, help="Seconds between lines")
+    args = parser.parse_args()
+
+    reader = Reader(args.path)
+    while True:
+        tick, populations = reader.read(lambda tick, ids, lives: (tick, np.bincount(ids.reshape(-1), minlength=len(reader.elements))))
+        counts = ", ".join(f"{name} {n}" for name, n in zip(reader.elements[1:], populations[1:].tolist()) if n)
+        print(f"tick {tick}: {counts or 'empty'}")
+        time.sleep(args.every)